@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+"""
+Synthetic master and LTO csv generator for the benchmarks.
+Writes a Silverstack style master csv and an LTO export of the same shoot, streaming both so that 10M clip
+catalogs can be generated without holding them in memory. Every clip's values are derived from a hash of the
+seed and its index, so the same arguments always produce the same files.
+"""
+
+# Import from Python Standard Library
+import os
+import csv
+import hashlib
+import argparse
+
+# Import from the package
+
+
+MASTER_FIELDS = ["Name", "Duration", "Frames", "File Size", "MD5", "Reel"]
+LTO_FIELDS = ["Name", "Path", "Frames", "Size", "MD5", "Media"]
+
+CLIPS_PER_REEL = 500
+REELS_PER_CAMERA = 1000
+SHOOT_DATE = "180512"
+
+# sidecar file types: extension, LTO folder, frames column
+SIDECARS = ((".wav", "AUDIO", ""),
+            (".xml", "CAMERA_MASTER", "1"),
+            ("_proxy.mov", "PROXY", None))
+
+WRITE_BLOCK = 10000
+
+
+def _fraction(digest, offset):
+    return int.from_bytes(digest[offset:offset + 2], 'big') / 65536
+
+
+class Clip:
+    """
+    The values of one clip, derived from the seed and its index
+    """
+    __slots__ = ('index', 'digest', 'name', 'reel', 'frames', 'size', 'md5')
+
+    def __init__(self, seed, index):
+        digest = hashlib.md5("{}:{}".format(seed, index).encode('ascii')).digest()
+        reel, clip = divmod(index, CLIPS_PER_REEL)
+        camera, reel = divmod(reel, REELS_PER_CAMERA)
+        self.index = index
+        self.digest = digest
+        self.reel = "{}{:03d}".format(chr(ord('A') + camera % 26), reel)
+        self.name = "{}C{:03d}_{}_R{}".format(self.reel, clip, SHOOT_DATE, digest[:2].hex().upper())
+        self.frames = 2 + int.from_bytes(digest[2:4], 'big') % 10000
+        self.size = 10 ** 6 + int.from_bytes(digest[4:9], 'big') % 10 ** 10
+        self.md5 = digest.hex()
+
+    def sidecars(self, ratio):
+        """
+        Returns the sidecar types of the clip: int(ratio) of them, plus one more for a fraction of clips
+        """
+        count = int(ratio) + (_fraction(self.digest, 9) < ratio - int(ratio))
+        return [SIDECARS[(self.index + i) % len(SIDECARS)] for i in range(count)]
+
+
+def _master_rows(clip, sidecar_ratio):
+    yield [clip.name + ".mov", "00:00:{:02d}".format(clip.frames // 24 % 60), clip.frames, clip.size, clip.md5,
+           clip.reel]
+    for extension, directory, frames in clip.sidecars(sidecar_ratio):
+        if directory == "PROXY":
+            # proxies are made after offload and are not on the master
+            continue
+        yield [clip.name + extension, "", frames, clip.size // 1000, "", clip.reel]
+
+
+def _lto_rows(clip, tape, sidecar_ratio, mismatch_rate):
+    frames, size, md5 = clip.frames, clip.size, clip.md5
+    if _fraction(clip.digest, 11) < mismatch_rate:
+        kind = clip.digest[13] % 3
+        if kind == 0:
+            frames += 1
+        elif kind == 1:
+            size += 1
+        else:
+            md5 = "0" * 32
+    folder = "/Volumes/{}/{}".format(tape, clip.reel)
+    yield [clip.name + ".mov", "{}/CAMERA_MASTER/{}".format(folder, clip.name), frames, size, md5, tape]
+    for extension, directory, sidecar_frames in clip.sidecars(sidecar_ratio):
+        yield [clip.name + extension, "{}/{}/{}".format(folder, directory, clip.name),
+               sidecar_frames if sidecar_frames is not None else frames, size // 1000, "", tape]
+
+
+def generate(out_dir, clips, seed=1, sidecar_ratio=2.0, mismatch_rate=0.01, missing_rate=0.01,
+             duplicate_rate=0.05, clips_per_tape=5000):
+    """
+    Writes master.csv and lto.csv for a shoot of clips video files under out_dir and returns their paths.
+    sidecar_ratio is the average number of non-video rows (audio, metadata, proxies) per video row,
+    mismatch_rate the fraction of LTO copies with a wrong frame count, size or MD5, missing_rate the fraction of
+    clips never written to tape and duplicate_rate the fraction also written to the following tape
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    master_path = os.path.join(out_dir, "master.csv")
+    lto_path = os.path.join(out_dir, "lto.csv")
+    with open(master_path, 'w', newline='') as master_file, open(lto_path, 'w', newline='') as lto_file:
+        master_writer = csv.writer(master_file)
+        lto_writer = csv.writer(lto_file)
+        master_writer.writerow(MASTER_FIELDS)
+        lto_writer.writerow(LTO_FIELDS)
+        master_block = []
+        lto_block = []
+        duplicates = []
+        for first in range(0, clips, clips_per_tape):
+            tape = "LTO{:05d}".format(first // clips_per_tape + 1)
+            copies = duplicates
+            duplicates = []
+            for index in range(first, min(first + clips_per_tape, clips)):
+                clip = Clip(seed, index)
+                master_block.extend(_master_rows(clip, sidecar_ratio))
+                if _fraction(clip.digest, 14) < missing_rate:
+                    continue
+                lto_block.extend(_lto_rows(clip, tape, sidecar_ratio, mismatch_rate))
+                if _fraction(clip.digest, 6) < duplicate_rate:
+                    duplicates.append(clip)
+                if len(lto_block) >= WRITE_BLOCK:
+                    master_writer.writerows(master_block)
+                    lto_writer.writerows(lto_block)
+                    master_block = []
+                    lto_block = []
+            # clips carried over from the previous tape are written at the end of this one
+            for clip in copies:
+                lto_block.extend(_lto_rows(clip, tape, sidecar_ratio, 0))
+        tapes = -(-clips // clips_per_tape)
+        for clip in duplicates:
+            lto_block.extend(_lto_rows(clip, "LTO{:05d}".format(tapes + 1), sidecar_ratio, 0))
+        master_writer.writerows(master_block)
+        lto_writer.writerows(lto_block)
+    return master_path, lto_path
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Write a synthetic master csv and LTO csv for benchmarking")
+    parser.add_argument("clips", type=int, help="number of video clips on the master")
+    parser.add_argument("-d", "--out_path", default=".", help="output directory")
+    parser.add_argument("--seed", type=int, default=1, help="generator seed (default: 1)")
+    parser.add_argument("--sidecar-ratio", type=float, default=2.0,
+                        help="average non-video rows per video row (default: 2.0)")
+    parser.add_argument("--mismatch-rate", type=float, default=0.01,
+                        help="fraction of LTO copies with a wrong frame count, size or MD5 (default: 0.01)")
+    parser.add_argument("--missing-rate", type=float, default=0.01,
+                        help="fraction of clips missing from the LTO csv (default: 0.01)")
+    parser.add_argument("--duplicate-rate", type=float, default=0.05,
+                        help="fraction of clips also written to the next tape (default: 0.05)")
+    parser.add_argument("--clips-per-tape", type=int, default=5000, help="clips per LTO tape (default: 5000)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    paths = generate(args.out_path, args.clips, args.seed, args.sidecar_ratio, args.mismatch_rate,
+                     args.missing_rate, args.duplicate_rate, args.clips_per_tape)
+    print("\n".join(paths))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark harness for ltocheck.
+Generates synthetic csvs at each requested scale, then times master ingestion, LTO ingestion, matching and
+report writing separately, repeating each run and keeping every sample, and saves the results as JSON so runs
+can be compared over time.
+"""
+
+# Import from Python Standard Library
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import datetime
+import tempfile
+import statistics
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import from the package
+import generate
+from ltocheck_engine import CheckResult, LTOSource, iter_results
+from ltocheck_index import MATCH_MODES, NameIndex
+from ltocheck_ingest import read_master, read_lto
+from ltocheck_report import ReportWriter
+
+
+DEFAULT_SCALES = (10000, 100000, 1000000)
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+PHASES = ("ingest master", "ingest lto", "match", "write report")
+
+
+def _revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(RESULTS_DIR),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_once(master_path, lto_path, report_path, match_mode):
+    """
+    Runs one check phase by phase and returns the seconds spent in each phase and the result counts
+    """
+    timings = {}
+    started = time.perf_counter()
+    master_records, master_raw_count = read_master(master_path)
+    timings["ingest master"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    lto_records, lto_raw_count = read_lto(lto_path)
+    timings["ingest lto"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    result = CheckResult(len(master_records), len(lto_records))
+    source = LTOSource(lto_path, lto_raw_count, len(lto_records))
+    lookup = NameIndex(lto_records).matcher(match_mode)
+    for row in iter_results(master_records, lookup):
+        result.add(row, source)
+    timings["match"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ReportWriter(report_path) as report:
+        report.write_rows(result.rows)
+    timings["write report"] = time.perf_counter() - started
+
+    counts = {"master rows": master_raw_count, "master videos": len(master_records),
+              "lto rows": lto_raw_count, "lto videos": len(lto_records), "result rows": len(result.rows),
+              "matches": result.matches, "non-matches": result.non_matches, "not found": result.not_found}
+    return timings, counts
+
+
+def benchmark(scales, match_modes, repeat, work_dir, generator_options, log=print):
+    """
+    Returns a list of results, one per scale and match mode, with every timing sample and the best of them
+    """
+    results = []
+    for clips in scales:
+        data_dir = os.path.join(work_dir, str(clips))
+        started = time.perf_counter()
+        master_path, lto_path = generate.generate(data_dir, clips, **generator_options)
+        log("Generated {} clips in {:.1f}s".format(clips, time.perf_counter() - started))
+        report_path = os.path.join(data_dir, "report.csv")
+        for match_mode in match_modes:
+            samples = {phase: [] for phase in PHASES}
+            counts = None
+            for _ in range(repeat):
+                timings, counts = run_once(master_path, lto_path, report_path, match_mode)
+                for phase in PHASES:
+                    samples[phase].append(timings[phase])
+            best = {phase: min(samples[phase]) for phase in PHASES}
+            best["total"] = sum(best.values())
+            results.append({"clips": clips,
+                            "match mode": match_mode,
+                            "master bytes": os.path.getsize(master_path),
+                            "lto bytes": os.path.getsize(lto_path),
+                            "counts": counts,
+                            "samples": samples,
+                            "median": {phase: statistics.median(samples[phase]) for phase in PHASES},
+                            "best": best,
+                            "rows per second": counts["master rows"] / best["total"] if best["total"] else None})
+            log("{: >9} clips {: <8} ".format(clips, match_mode)
+                + "  ".join("{} {:.3f}s".format(phase, best[phase]) for phase in PHASES + ("total",)))
+            os.remove(report_path)
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Time ltocheck's ingestion, matching and report writing")
+    parser.add_argument("-s", "--scales", type=int, nargs="+", default=list(DEFAULT_SCALES),
+                        help="master clip counts to benchmark (default: {})".format(
+                            " ".join(str(scale) for scale in DEFAULT_SCALES)))
+    parser.add_argument("--match-mode", choices=MATCH_MODES, nargs="+", default=["exact"],
+                        help="match modes to benchmark (default: exact)")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="runs per scale, the best is kept (default: 3)")
+    parser.add_argument("-o", "--output", default=None,
+                        help="results JSON path (default: benchmarks/results/<date>_<revision>.json)")
+    parser.add_argument("--work-dir", default=None,
+                        help="directory for the generated csvs (default: a temporary directory)")
+    parser.add_argument("--seed", type=int, default=1, help="generator seed (default: 1)")
+    parser.add_argument("--sidecar-ratio", type=float, default=2.0,
+                        help="average non-video rows per video row (default: 2.0)")
+    parser.add_argument("--mismatch-rate", type=float, default=0.01,
+                        help="fraction of LTO copies with a wrong frame count, size or MD5 (default: 0.01)")
+    parser.add_argument("--missing-rate", type=float, default=0.01,
+                        help="fraction of clips missing from the LTO csv (default: 0.01)")
+    parser.add_argument("--duplicate-rate", type=float, default=0.05,
+                        help="fraction of clips also written to the next tape (default: 0.05)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    generator_options = {"seed": args.seed, "sidecar_ratio": args.sidecar_ratio,
+                         "mismatch_rate": args.mismatch_rate, "missing_rate": args.missing_rate,
+                         "duplicate_rate": args.duplicate_rate}
+    revision = _revision()
+    started = datetime.datetime.now()
+    if args.work_dir is not None:
+        results = benchmark(args.scales, args.match_mode, args.repeat, args.work_dir, generator_options)
+    else:
+        with tempfile.TemporaryDirectory(prefix="ltocheck_bench_") as work_dir:
+            results = benchmark(args.scales, args.match_mode, args.repeat, work_dir, generator_options)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, "{:%Y-%m-%d_%H%M%S}_{}.json".format(started, revision or "unknown"))
+    with open(output, 'w') as f:
+        json.dump({"started": started.isoformat(timespec="seconds"),
+                   "revision": revision,
+                   "python": platform.python_version(),
+                   "platform": platform.platform(),
+                   "cpu count": os.cpu_count(),
+                   "repeat": args.repeat,
+                   "generator": generator_options,
+                   "results": results}, f, indent=2)
+    print("Results saved to {}".format(output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+"""
+Startup time benchmark for the ltocheck CLI.
+Times fresh interpreter runs of `ltocheck --version` and of a small check, and lists the modules each run
+imported so GUI or optional heavy modules creeping onto the CLI path are caught. Exits with status 1 when a
+command loads one of them or, with --budget, when its best time is over budget.
+"""
+
+# Import from Python Standard Library
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import datetime
+import tempfile
+import statistics
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import from the package
+import generate
+from run import RESULTS_DIR, _revision
+
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+# modules the CLI must not import for a plain check
+HEAVY_MODULES = ("tkinter", "numpy", "zstandard", "multiprocessing", "concurrent", "cProfile", "sqlite3", "http",
+                 "pickle")
+
+SMALL_CHECK_CLIPS = 1000
+
+
+def _imported_modules(command):
+    """
+    Returns the top level packages a command imports, from the interpreter's -X importtime report
+    """
+    process = subprocess.run([sys.executable, "-X", "importtime"] + command, capture_output=True, text=True)
+    modules = set()
+    for line in process.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            name = line.rsplit("|", 1)[1].strip()
+            modules.add(name.split(".")[0])
+    return modules
+
+
+def time_command(command, repeat):
+    """
+    Runs a command in a fresh interpreter repeat times, returns the wall time of every run
+    """
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable] + command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def commands(work_dir):
+    """
+    Returns the benchmarked commands by name, generating the small check's csvs under work_dir
+    """
+    master_path, lto_path = generate.generate(os.path.join(work_dir, "data"), SMALL_CHECK_CLIPS)
+    # without snapshots, which load pickle to read the master csv's snapshot and would write to the home folder
+    return {"version": [MAIN, "--version"],
+            "small check": [MAIN, "-m", master_path, "-l", lto_path, "-d", work_dir, "-o", "report.csv",
+                            "--no-snapshots"]}
+
+
+def benchmark(work_dir, repeat, log=print):
+    """
+    Returns a result per command with every timing sample and the heavy modules it imported
+    """
+    results = []
+    baseline = min(time_command(["-c", "pass"], repeat))
+    log("{: <12} best {:.3f}s".format("python", baseline))
+    for name, command in commands(work_dir).items():
+        samples = time_command(command, repeat)
+        heavy = sorted(_imported_modules(command).intersection(HEAVY_MODULES))
+        results.append({"command": name,
+                        "samples": samples,
+                        "best": min(samples),
+                        "median": statistics.median(samples),
+                        "over interpreter": min(samples) - baseline,
+                        "heavy modules": heavy})
+        log("{: <12} best {:.3f}s  median {:.3f}s  heavy modules: {}".format(
+            name, min(samples), statistics.median(samples), ", ".join(heavy) or "none"))
+    return baseline, results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Time ltocheck's CLI startup")
+    parser.add_argument("-r", "--repeat", type=int, default=10, help="runs per command, the best is kept "
+                                                                     "(default: 10)")
+    parser.add_argument("--budget", type=float, default=None, metavar="SECONDS",
+                        help="fail when a command's best time exceeds the interpreter's own startup by more than this")
+    parser.add_argument("-o", "--output", default=None,
+                        help="results JSON path (default: benchmarks/results/<date>_<revision>_startup.json)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    revision = _revision()
+    started = datetime.datetime.now()
+    with tempfile.TemporaryDirectory(prefix="ltocheck_startup_") as work_dir:
+        baseline, results = benchmark(work_dir, args.repeat)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, "{:%Y-%m-%d_%H%M%S}_{}_startup.json".format(started,
+                                                                                     revision or "unknown"))
+    with open(output, 'w') as f:
+        json.dump({"started": started.isoformat(timespec="seconds"),
+                   "revision": revision,
+                   "python": platform.python_version(),
+                   "platform": platform.platform(),
+                   "repeat": args.repeat,
+                   "interpreter": baseline,
+                   "results": results}, f, indent=2)
+    print("Results saved to {}".format(output))
+
+    failed = False
+    for result in results:
+        if result["heavy modules"]:
+            print("{} imported {}".format(result["command"], ", ".join(result["heavy modules"])))
+            failed = True
+        if args.budget is not None and result["over interpreter"] > args.budget:
+            print("{} took {:.3f}s over the interpreter's startup, budget {:.3f}s".format(
+                result["command"], result["over interpreter"], args.budget))
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ GUI for ltocheck_gui.py
 
 # Import from Python Standard Library
 import os
+import queue
 import datetime
 import tkinter as tk
 import tkinter.ttk as ttk
@@ -16,6 +17,15 @@ import ltocheck_gui
 import gui_support
 
 
+POLL_MS = 100
+WHEEL_ROWS = 3
+DEFAULT_ROW_HEIGHT = 20
+HEADING_HEIGHT = 24
+COMPRESSED_CSV_PATTERNS = "*.csv.gz *.csv.bz2 *.csv.xz *.csv.zst"
+
+COLUMN_WIDTHS = {"STATUS": 60, "FILENAME": 150, "FRAMES_MASTER": 70, "FRAMES_LTO": 70, "SIZE_MASTER": 90,
+                 "SIZE_LTO": 90, "MD5_MASTER": 120, "MD5_LTO": 120, "LTO_TAPE": 70, "ERROR MESSAGES": 150}
+
 def vp_start_gui():
     """Starting point when module is the main routine."""
     global val, w, root
@@ -59,11 +69,11 @@ class LTOCheck:
         self.style.configure('.', foreground=_fgcolor)
         self.style.map('.',background=[('selected', _compcolor), ('active', _ana2color)])
 
-        top.geometry("800x250+630+60")
+        top.geometry("1000x640+430+60")
         top.title("LTO Check")
 
         self.main_frame = tk.Frame(top)
-        self.main_frame.place(relx=0.01, rely=0.03, relheight=0.4, relwidth=0.98)
+        self.main_frame.place(relx=0.01, y=8, height=100, relwidth=0.98)
 
         self.main_frame.configure(relief=tk.GROOVE, borderwidth="2", width=780)
 
@@ -98,6 +108,12 @@ class LTOCheck:
         self.check.configure(text='''Check''')
         self.check.configure(width=92)
 
+        self.cancel = tk.Button(self.main_frame, command=self.cancel_check)
+        self.cancel.place(relx=0.89, rely=0.2, height=26, width=80)
+        self.cancel.configure(activebackground="#d9d9d9")
+        self.cancel.configure(text='''Cancel''')
+        self.cancel.configure(state=tk.DISABLED)
+
         self.save_report = tk.Button(self.main_frame, command=self.save_report)
         self.save_report.place(relx=0.77, rely=0.5, height=26, width=95)
         self.save_report.configure(activebackground="#d9d9d9")
@@ -116,14 +132,71 @@ class LTOCheck:
         self.lto_csv_path_dialog.configure(cursor="fleur")
         self.lto_csv_path_dialog.configure(text='''...''')
 
+        self.progress_label = tk.Label(self.main_frame)
+        self.progress_label.place(relx=0.15, rely=0.8, height=18, relwidth=0.84)
+        self.progress_label.configure(anchor=tk.W)
+        self.progress_label.configure(font="TkSmallCaptionFont")
+
         self.results_frame = tk.LabelFrame(top)
-        self.results_frame.place(relx=0.01, rely=0.43, relheight=0.54, relwidth=0.98)
+        self.results_frame.place(relx=0.01, y=115, relheight=1.0, height=-123, relwidth=0.98)
         self.results_frame.configure(relief=tk.GROOVE)
         self.results_frame.configure(text='''Result''')
         self.results_frame.configure(width=780)
 
+        self.status_filter_label = tk.Label(self.results_frame)
+        self.status_filter_label.place(relx=0.01, y=4, height=22, width=50)
+        self.status_filter_label.configure(anchor=tk.E)
+        self.status_filter_label.configure(text='''Status:''')
+
+        self.status_filter = ttk.Combobox(self.results_frame, state="readonly",
+                                          values=[ltocheck_gui.ALL, "MATCH", "ERROR"])
+        self.status_filter.place(relx=0.01, x=54, y=4, height=22, width=90)
+        self.status_filter.set(ltocheck_gui.ALL)
+        self.status_filter.bind("<<ComboboxSelected>>", self.filter_results)
+
+        self.tape_filter_label = tk.Label(self.results_frame)
+        self.tape_filter_label.place(relx=0.01, x=154, y=4, height=22, width=60)
+        self.tape_filter_label.configure(anchor=tk.E)
+        self.tape_filter_label.configure(text='''LTO tape:''')
+
+        self.tape_filter = ttk.Combobox(self.results_frame, state="readonly", values=[ltocheck_gui.ALL],
+                                        postcommand=self.update_tape_filter)
+        self.tape_filter.place(relx=0.01, x=218, y=4, height=22, width=120)
+        self.tape_filter.set(ltocheck_gui.ALL)
+        self.tape_filter.bind("<<ComboboxSelected>>", self.filter_results)
+
+        self.error_filter_label = tk.Label(self.results_frame)
+        self.error_filter_label.place(relx=0.01, x=348, y=4, height=22, width=40)
+        self.error_filter_label.configure(anchor=tk.E)
+        self.error_filter_label.configure(text='''Error:''')
+
+        self.error_filter = ttk.Combobox(self.results_frame, state="readonly",
+                                         values=[ltocheck_gui.ALL] + [label for label, _ in ltocheck_gui.ERROR_FILTERS])
+        self.error_filter.place(relx=0.01, x=392, y=4, height=22, width=170)
+        self.error_filter.set(ltocheck_gui.ALL)
+        self.error_filter.bind("<<ComboboxSelected>>", self.filter_results)
+
+        self.row_count_label = tk.Label(self.results_frame)
+        self.row_count_label.place(relx=0.99, x=-250, y=4, height=22, width=250)
+        self.row_count_label.configure(anchor=tk.E)
+
+        self.results_tree = ttk.Treeview(self.results_frame, columns=ltocheck_gui.FIELDNAMES, show="headings",
+                                         selectmode="extended")
+        self.results_tree.place(relx=0.01, y=32, relwidth=0.96, relheight=0.76, height=-32)
+        for column in ltocheck_gui.FIELDNAMES:
+            self.results_tree.heading(column, text=column, command=lambda c=column: self.sort_results(c))
+            self.results_tree.column(column, width=COLUMN_WIDTHS[column], minwidth=40, stretch=True)
+        self.results_tree.tag_configure("ERROR", foreground="#b00000")
+        self.results_tree.bind("<Configure>", self.resize_results)
+        self.results_tree.bind("<MouseWheel>", self.wheel_results)
+        self.results_tree.bind("<Button-4>", self.wheel_results)
+        self.results_tree.bind("<Button-5>", self.wheel_results)
+
+        self.results_scrollbar = ttk.Scrollbar(self.results_frame, orient="vertical", command=self.scroll_results)
+        self.results_scrollbar.place(relx=0.97, y=32, relwidth=0.02, relheight=0.76, height=-32)
+
         self.results_textbox = ScrolledText(self.results_frame)
-        self.results_textbox.place(relx=0.01, rely=0.15, relheight=0.8, relwidth=0.97, y=-11, h=11)
+        self.results_textbox.place(relx=0.01, rely=0.78, relheight=0.2, relwidth=0.98)
         self.results_textbox.configure(background="white")
         self.results_textbox.configure(font="TkTextFont")
         self.results_textbox.configure(insertborderwidth="3")
@@ -131,8 +204,11 @@ class LTOCheck:
         self.results_textbox.configure(width=10)
         self.results_textbox.configure(wrap=tk.NONE)
 
-        self.results_summary = ""
-        self.results_report = []
+        self.result = None
+        self.worker = None
+        self.view = ltocheck_gui.ResultsView()
+        self.first_row = 0
+        self.page_rows = 1
 
     def get_lto_csv_path(self):
         if os.path.exists(self.lto_csv_path.get()):
@@ -142,32 +218,179 @@ class LTOCheck:
             self.lto_csv_path.delete(0, 'end')
         lto_csv_path = filedialog.askopenfilename(initialdir=initialdir,
                                                   title="Select the LTO csv file", filetypes=(
-                                                   ("csv files", "*.csv"), ("all files", "*.*")))
+                                                   ("csv files", "*.csv"),
+                                                   ("compressed csv files", COMPRESSED_CSV_PATTERNS),
+                                                   ("all files", "*.*")))
         self.lto_csv_path.insert(0, lto_csv_path)
 
     def get_ss_csv_path(self):
         self.ss_csv_path.delete(0, 'end')
         ss_csv_path = filedialog.askopenfilename(initialdir="/Volumes/GoogleDrive/My\ Drive/",
                                                  title="Select the SS csv file", filetypes=(
-                                                  ("csv files", "*.csv"), ("all files", "*.*")))
+                                                  ("csv files", "*.csv"),
+                                                  ("compressed csv files", COMPRESSED_CSV_PATTERNS),
+                                                  ("all files", "*.*")))
         self.ss_csv_path.insert(0, ss_csv_path)
 
     def run_check(self):
+        if self.worker is not None and self.worker.running():
+            return
         if os.path.exists(self.ss_csv_path.get()) and os.path.exists(self.lto_csv_path.get()):
-            self.results_summary, self.results_report = ltocheck_gui.check(self.ss_csv_path.get(), self.lto_csv_path.get())
-            self.results_printer()
+            self.result = None
+            self.view = ltocheck_gui.ResultsView()
+            self.tape_filter.set(ltocheck_gui.ALL)
+            self.filter_results()
+            self.show_sort()
+            self.results_textbox.delete("1.0", tk.END)
+            self.worker = ltocheck_gui.CheckWorker(self.ss_csv_path.get(), self.lto_csv_path.get())
+            self.worker.start()
+            self.check.configure(state=tk.DISABLED)
+            self.cancel.configure(state=tk.NORMAL)
+            self.progress_label.configure(text="Starting check")
+            self.main_frame.after(POLL_MS, self.poll_worker)
         else:
             messagebox.showinfo(title="Message", message="Please enter correct csv paths using the '...' buttons")
 
+    def cancel_check(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.cancel.configure(state=tk.DISABLED)
+            self.progress_label.configure(text="Cancelling")
+
+    def poll_worker(self):
+        """
+        Drains the worker's messages on the Tk main thread, then polls again until the check has ended
+        """
+        worker = self.worker
+        finished = False
+        new_rows = False
+        while not finished:
+            try:
+                message = worker.messages.get_nowait()
+            except queue.Empty:
+                break
+            kind = message[0]
+            if kind == "progress":
+                self.progress_printer(*message[1:])
+            elif kind == "rows":
+                self.view.extend(message[1])
+                new_rows = True
+            else:
+                finished = True
+                self.check.configure(state=tk.NORMAL)
+                self.cancel.configure(state=tk.DISABLED)
+                if kind == "done":
+                    self.result = message[1]
+                    self.view.resort()
+                    new_rows = True
+                    self.progress_label.configure(text="Check complete")
+                    self.results_printer()
+                elif kind == "cancelled":
+                    self.progress_label.configure(text="Check cancelled")
+                else:
+                    self.progress_label.configure(text=message[1])
+                    messagebox.showinfo(title="Message", message=message[1])
+        if new_rows:
+            self.show_page()
+        if not finished:
+            self.main_frame.after(POLL_MS, self.poll_worker)
+
+    def progress_printer(self, phase, done, total, rate, eta):
+        if total is None:
+            text = "{}: {:,} rows, {:,.0f} rows/s".format(phase, done, rate)
+        else:
+            text = "{}: {:,} / {:,} master files, {:,.0f} files/s".format(phase, done, total, rate)
+            if eta is not None:
+                text += ", {:.0f}s left".format(eta)
+        self.progress_label.configure(text=text)
+
+    def show_page(self, first=None):
+        """
+        Fills the results table with the page of rows starting at first. The table only ever holds the rows
+        on screen; the scrollbar is driven from the position in the whole filtered result
+        """
+        total = len(self.view)
+        if first is None:
+            first = self.first_row
+        first = max(0, min(first, total - self.page_rows))
+        self.first_row = first
+        self.results_tree.delete(*self.results_tree.get_children())
+        for values in self.view.page(first, self.page_rows):
+            self.results_tree.insert("", tk.END, values=values, tags=(values[0],))
+        if total:
+            self.results_scrollbar.set(first / total, min(1.0, (first + self.page_rows) / total))
+        else:
+            self.results_scrollbar.set(0.0, 1.0)
+        self.row_count_label.configure(text="{:,} of {:,} rows".format(total, len(self.view.rows)))
+
+    def resize_results(self, event):
+        row_height = int(self.style.lookup("Treeview", "rowheight") or DEFAULT_ROW_HEIGHT)
+        page_rows = max(1, (event.height - HEADING_HEIGHT) // row_height)
+        if page_rows != self.page_rows:
+            self.page_rows = page_rows
+            self.show_page()
+
+    def scroll_results(self, *args):
+        if args[0] == "moveto":
+            self.show_page(int(float(args[1]) * len(self.view)))
+        elif args[0] == "scroll":
+            step = int(args[1])
+            if args[2] == "pages":
+                step *= self.page_rows
+            self.show_page(self.first_row + step)
+
+    def wheel_results(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.show_page(self.first_row - WHEEL_ROWS)
+        else:
+            self.show_page(self.first_row + WHEEL_ROWS)
+        return "break"
+
+    def update_tape_filter(self):
+        self.tape_filter.configure(values=[ltocheck_gui.ALL] + sorted(self.view.tapes))
+
+    def filter_results(self, event=None):
+        status = self.status_filter.get()
+        tape = self.tape_filter.get()
+        error = dict(ltocheck_gui.ERROR_FILTERS).get(self.error_filter.get())
+        self.view.set_filter(None if status == ltocheck_gui.ALL else status,
+                             None if tape == ltocheck_gui.ALL else tape,
+                             error)
+        self.show_page(0)
+
+    def sort_results(self, column):
+        """
+        Cycles a column through ascending, descending and report order
+        """
+        if self.view.sort_column != column:
+            self.view.sort(column)
+        elif not self.view.sort_reverse:
+            self.view.sort(column, reverse=True)
+        else:
+            self.view.sort(None)
+        self.show_sort()
+        self.show_page(0)
+
+    def show_sort(self):
+        for column in ltocheck_gui.FIELDNAMES:
+            text = column
+            if column == self.view.sort_column:
+                text += " \u25bc" if self.view.sort_reverse else " \u25b2"
+            self.results_tree.heading(column, text=text)
+
     def results_printer(self):
-        self.results_textbox.insert(tk.END, self.results_summary)
+        self.results_textbox.delete("1.0", tk.END)
+        self.results_textbox.insert(tk.END, self.result.summary())
 
     def save_report(self):
+        if self.result is None:
+            return
         f = filedialog.asksaveasfile(initialdir=os.getcwd(), mode='w', defaultextension=".csv",
                                      initialfile="lto_check_report_{:%Y-%m-%d_%H%M}.csv"
                                      .format(datetime.datetime.today()))
         if f:
-            ltocheck_gui.write_csv(f, self.results_report)
+            with f:
+                ltocheck_gui.write_csv(f, self.result)
 
 
 # The following code is added to facilitate the Scrolled widgets you specified.
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+
+"""
+Persistent SQLite catalog of LTO csv exports.
+`ltocheck index` loads the video rows of LTO csvs once, skipping csvs whose path, size and mtime are unchanged,
+and checks can then look master clips up in the catalog instead of re-parsing every export.
+Every distinct clip name is also split into grams, so contains lookups are indexed queries as well.
+"""
+
+# Import from Python Standard Library
+import os
+import time
+import sqlite3
+import collections
+
+# Import from the package
+from ltocheck_engine import CheckResult, LTOSource, iter_results, load_master, log_nothing
+from ltocheck_index import GRAM_LENGTH, name_grams
+from ltocheck_ingest import read_lto
+from ltocheck_records import LTORecord, parse_media
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    raw_count INTEGER NOT NULL,
+    video_count INTEGER NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lto_rows (
+    file_id INTEGER NOT NULL REFERENCES files (id),
+    seq INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    frames,
+    size,
+    md5,
+    media TEXT
+);
+CREATE INDEX IF NOT EXISTS lto_rows_name ON lto_rows (name);
+CREATE INDEX IF NOT EXISTS lto_rows_file ON lto_rows (file_id);
+CREATE TABLE IF NOT EXISTS lto_names (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lto_grams (
+    gram TEXT NOT NULL,
+    name_id INTEGER NOT NULL REFERENCES lto_names (id),
+    PRIMARY KEY (gram, name_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS gram_counts (
+    gram TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+# catalogs of an older version are brought up to date when opened; version 1 added the gram tables
+CATALOG_VERSION = 1
+
+_ROW_COLUMNS = "lto_rows.file_id, lto_rows.name, lto_rows.frames, lto_rows.size, lto_rows.md5, lto_rows.media"
+
+# text sorting after every clip name that starts with a given prefix
+_PREFIX_END = "\U0010ffff"
+
+
+def connect(catalog_path):
+    """
+    Opens (creating if needed) a catalog database
+    """
+    directory = os.path.dirname(catalog_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(catalog_path)
+    connection.executescript(_SCHEMA)
+    if connection.execute("PRAGMA user_version").fetchone()[0] < CATALOG_VERSION:
+        with connection:
+            names = [name for name, in connection.execute("SELECT DISTINCT name FROM lto_rows")]
+            _add_names(connection, names)
+            connection.execute("PRAGMA user_version = {}".format(CATALOG_VERSION))
+    return connection
+
+
+def _add_names(connection, names):
+    """
+    Adds the clip names not yet in the catalog to the name and gram tables.
+    Names are kept when the csvs carrying them are replaced, which only leaves a few extra candidates to lookups
+    """
+    grams = collections.Counter()
+    postings = []
+    for name in names:
+        cursor = connection.execute("INSERT OR IGNORE INTO lto_names (name) VALUES (?)", (name,))
+        if cursor.rowcount:
+            for gram in name_grams(name):
+                postings.append((gram, cursor.lastrowid))
+                grams[gram] += 1
+    connection.executemany("INSERT INTO lto_grams (gram, name_id) VALUES (?, ?)", postings)
+    connection.executemany("INSERT OR IGNORE INTO gram_counts (gram, count) VALUES (?, 0)",
+                           ((gram,) for gram in grams))
+    connection.executemany("UPDATE gram_counts SET count = count + ? WHERE gram = ?",
+                           ((count, gram) for gram, count in grams.items()))
+
+
+def index_files(catalog_path, lto_paths, log=None):
+    """
+    Loads LTO csvs into the catalog. A csv already indexed with the same size and mtime is skipped,
+    a changed one has its rows replaced. Returns the number of csvs indexed and skipped
+    """
+    log = log or log_nothing
+    indexed = 0
+    skipped = 0
+    connection = connect(catalog_path)
+    try:
+        for lto_path in lto_paths:
+            path = os.path.abspath(lto_path)
+            stat = os.stat(path)
+            known = connection.execute("SELECT id, size, mtime_ns FROM files WHERE path = ?", (path,)).fetchone()
+            if known is not None and known[1] == stat.st_size and known[2] == stat.st_mtime_ns:
+                log("Skipping unchanged LTO csv {}".format(path))
+                skipped += 1
+                continue
+            lto_records, raw_count = read_lto(path)
+            with connection:
+                if known is not None:
+                    connection.execute("DELETE FROM lto_rows WHERE file_id = ?", (known[0],))
+                    connection.execute("DELETE FROM files WHERE id = ?", (known[0],))
+                file_id = connection.execute(
+                    "INSERT INTO files (path, size, mtime_ns, raw_count, video_count, indexed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (path, stat.st_size, stat.st_mtime_ns, raw_count, len(lto_records), time.time())).lastrowid
+                connection.executemany(
+                    "INSERT INTO lto_rows (file_id, seq, name, frames, size, md5, media) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    ((file_id, seq, record.name, record.frames, record.size, record.md5, record.media)
+                     for seq, record in enumerate(lto_records)))
+                _add_names(connection, {record.name for record in lto_records})
+            log("Indexed LTO csv {}\n{} files found, {} video files filtered".format(path, raw_count,
+                                                                                    len(lto_records)))
+            indexed += 1
+    finally:
+        connection.close()
+    return indexed, skipped
+
+
+class CatalogRecord(LTORecord):
+    """
+    An LTO record read back from the catalog, with the id of the csv it was indexed from
+    """
+    __slots__ = ('file_id',)
+
+    def __init__(self, file_id, name, frames, size, md5, media):
+        LTORecord.__init__(self, name, frames, size, md5, parse_media(media))
+        self.file_id = file_id
+
+
+class _CatalogLookup:
+    """
+    Answers master name lookups from the catalog, returning CatalogRecords in catalog order.
+    Contains lookups intersect the names carrying the two rarest grams of the master name, as NameIndex does,
+    and names shorter than a gram are searched in the distinct names
+    """
+
+    def __init__(self, connection, match_mode):
+        self.connection = connection
+        self.match_mode = match_mode
+        # the number of LTO names carrying each gram of the master names looked up so far
+        self._gram_counts = {}
+
+    def __call__(self, name):
+        if self.match_mode == "exact":
+            rows = self.connection.execute(
+                "SELECT {} FROM lto_rows WHERE name = ? ORDER BY file_id, seq".format(_ROW_COLUMNS), (name,))
+        elif self.match_mode == "prefix":
+            rows = self.connection.execute(
+                "SELECT {} FROM lto_rows WHERE name >= ? AND name < ? ORDER BY file_id, seq".format(_ROW_COLUMNS),
+                (name, name + _PREFIX_END))
+        elif len(name) < GRAM_LENGTH:
+            rows = self.connection.execute(
+                "SELECT {} FROM lto_rows WHERE name IN (SELECT name FROM lto_names WHERE instr(name, ?) > 0) "
+                "ORDER BY file_id, seq".format(_ROW_COLUMNS), (name,))
+        else:
+            counts = self._gram_counts
+            grams = name_grams(name)
+            missing = [gram for gram in grams if gram not in counts]
+            if missing:
+                counts.update(dict.fromkeys(missing, 0))
+                counts.update(self.connection.execute(
+                    "SELECT gram, count FROM gram_counts WHERE gram IN ({})".format(", ".join("?" * len(missing))),
+                    missing))
+            rarest = sorted(grams, key=counts.__getitem__)[:2]
+            if counts[rarest[0]] == 0:      # a gram no LTO name carries
+                return []
+            candidates = " INTERSECT ".join(["SELECT name_id FROM lto_grams WHERE gram = ?"] * len(rarest))
+            rows = self.connection.execute(
+                "SELECT {} FROM lto_rows WHERE name IN (SELECT name FROM lto_names WHERE id IN ({}) "
+                "AND instr(name, ?) > 0) ORDER BY file_id, seq".format(_ROW_COLUMNS, candidates),
+                (*rarest, name))
+        return [CatalogRecord(*row) for row in rows]
+
+
+def check_catalog(master_path, catalog_path, match_mode="exact", on_row=None, keep_rows=True, log=None,
+                  snapshots=None):
+    """
+    Checks a master csv against every LTO csv in the catalog and returns the CheckResult,
+    with one summary source per indexed csv. snapshots is an optional SnapshotCache for the parsed master csv
+    """
+    log = log or log_nothing
+    if not os.path.exists(catalog_path):
+        raise FileNotFoundError(2, "No such file or directory", catalog_path)
+    result = CheckResult(keep_rows=keep_rows)
+    master_records = load_master(result, master_path, log, snapshots=snapshots)
+    connection = connect(catalog_path)
+    try:
+        sources = {}
+        for file_id, path, raw_count, video_count in connection.execute(
+                "SELECT id, path, raw_count, video_count FROM files ORDER BY id"):
+            sources[file_id] = LTOSource(path, raw_count, video_count)
+            result.sources.append(sources[file_id])
+            result.lto_raw_count += raw_count
+            result.lto_count += video_count
+        log("Catalog {} holds {} LTO csvs, {} video files".format(catalog_path, len(sources), result.lto_count))
+
+        log("Attempting compare against the catalog")
+        lookup = _CatalogLookup(connection, match_mode)
+        with result.metrics.phase("compare", streams=True) as phase:
+            for row in iter_results(master_records, lookup):
+                result.add(row, sources[row.lto.file_id] if row.lto is not None else None)
+                if on_row is not None:
+                    on_row(row)
+            phase.rows = result.master_count
+    finally:
+        connection.close()
+    return result
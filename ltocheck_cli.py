@@ -3,217 +3,71 @@
 """
 Command line interface tool to compare a master csv to an LTO csv.
 Compares file size, frame quantity and MD5 Hash.
+The catalog, out-of-core, parallel, columnar, incremental, snapshot, verify, watch and serve modules are imported
+by the commands that use them, so a plain check only loads the engine.
 """
 
 # Import from Python Standard Library
-import csv
+import os
 import sys
-import collections
+import glob
+import datetime
 
 # Import from the package
+import ltocheck_console
+import ltocheck_csvfile
+import ltocheck_engine
+import ltocheck_metrics
+from ltocheck_report import ReportWriter
 
 
-def _read_ss_csv(input_file, debug):
-    """
-    Opens a SS csv as a dictionary with header as key, sorts by given column key, outputs filtered dictionary
-    """
-    _dprinter("Attempting master csv read", debug)
-    with open(input_file, 'r') as f:
-        reader = csv.DictReader(f)
-        reader = sorted(reader, key=lambda row: row['Name'])
-        filtered_dict = []
-
-        def _filter_dict_ss(row):
-            if row['Frames'] is not "" \
-                    and row['Frames'] is not "1":
-                return row
-
-        for row in filter(_filter_dict_ss, reader):
-            filtered_row = collections.OrderedDict([("Name", row['Name'].split('.')[0]),
-                                                    ("Frames", row['Frames']),
-                                                    ("Size", row['File Size']),
-                                                    ("MD5", row['MD5'])])
-            filtered_dict.append(filtered_row)
-    f.close()
-    _dprinter("Master csv read and sorted from path {}\n{} files found, {} video files filtered"
-              .format(input_file, len(reader), len(filtered_dict)), debug)
-    return filtered_dict, len(filtered_dict)
-
-
-def _read_lto_csv(input_file, debug):
+def _summary_printer(result):
+    print("\n{}".format(result.summary()))
+    print("\n{}".format(result.metrics.summary()))
+
+
+def _finish(args, result, report, streamed_seconds, command):
     """
-    Opens an LTO csv as a dictionary with header as key, sorts by given column key, outputs filtered dictionary
+    Records the report writing time on the result's metrics, prints the summary and exports the metrics
     """
-    _dprinter("Attempting LTO csv read", debug)
-    with open(input_file, 'r') as f:
-        reader = csv.DictReader(f)
-        reader = sorted(reader, key=lambda row: row['Name'])
-        filtered_dict = []
-
-        def _filter_dict_lto(row):
-            if "CAMERA_MASTER" in row['Path'] \
-                    and row['Frames'] is not "" \
-                    and row['Frames'] is not "1":
-                return row
-
-        for row in filter(_filter_dict_lto, reader):
-            filtered_row = collections.OrderedDict([("Name", row['Name'].split('.')[0]),
-                                                    ("Frames", row['Frames']),
-                                                    ("Size", row['Size']),
-                                                    ("MD5", row['MD5']),
-                                                    ("Media", row['Media'])])
-            filtered_dict.append(filtered_row)
-    f.close()
-    _dprinter("LTO csv read and sorted from path {}\n{} files found, {} video files filtered"
-              .format(input_file, len(reader), len(filtered_dict)), debug)
-    return filtered_dict, len(filtered_dict)
-
-
-def _compare_dicts(args, ss_dict, lto_dict, verbose, debug):
+    result.metrics.split("write report", report.seconds, report.rows_written, within=streamed_seconds)
+    _summary_printer(result)
+    if args.metrics_json:
+        ltocheck_metrics.write_json(args.metrics_json, result, command)
+
+
+def _expand_paths(patterns):
     """
-    Compares two given dictionaries, returns quanity of matches, non matches and not found files
-    as well as outputting data to the results printer func and csv creator
+    Expands any glob patterns the shell left unexpanded, keeping unmatched patterns so they are reported as missing
     """
-    _dprinter("Attempting compare the csvs", debug)
-    match = 0
-    non_match = 0
-    not_found = 0
-    output_file = "{}/{}".format(args.out_path.strip('/'), args.out_name)
-    for ss_row in ss_dict:
-        file_found = False
-        for lto_row in lto_dict:
-            if ss_row['Name'] in lto_row['Name']:
-                file_found = True
-                match_status = ""
-                error_message = ""
-                if ss_row["Frames"] == lto_row["Frames"] \
-                        and ss_row["Size"] == lto_row["Size"] \
-                        and ss_row["MD5"].upper() == lto_row["MD5"].upper():
-                    match += 1
-                    match_status = "MATCH"
-                else:
-                    if ss_row["Frames"] not in lto_row["Frames"]:
-                        non_match += 1
-                        match_status = "ERROR"
-                        error_message += "FRAME COUNT MISMATCH \t"
-                    if ss_row["Size"] not in lto_row["Size"]:
-                        non_match += 1
-                        match_status = "ERROR"
-                        error_message += "SIZE MISMATCH \t"
-                    if ss_row["MD5"] != lto_row["MD5"]:
-                        non_match += 1
-                        match_status = "ERROR"
-                        error_message += "MD5 MISMATCH \t"
-                _write_csv(output_file, ss_row, lto_row, match_status, error_message, debug)
-                _results_printer(ss_row, lto_row, match_status, error_message, verbose, debug)
-        if file_found is False:
-            not_found += 1
-            _write_csv(output_file, ss_row, None, "ERROR", "FILE NOT FOUND ", debug)
-            _results_printer(ss_row, None, "ERROR", "FILE NOT FOUND ", verbose, debug)
-    return match, non_match, not_found
-
-
-first_write = True
-
-
-def _write_csv(output_filepath, ss_row, lto_row, match_status, error_message, debug):
-    global first_write
-    _dprinter("Attempting to write output csv to {}".format(output_filepath), debug)
-    with open(output_filepath, 'a+') as f:
-        fieldnames = ["STATUS",
-                      "FILENAME",
-                      "FRAMES_MASTER",
-                      "FRAMES_LTO",
-                      "SIZE_MASTER",
-                      "SIZE_LTO",
-                      "MD5_MASTER",
-                      "MD5_LTO",
-                      "LTO_TAPE",
-                      "ERROR MESSAGES"]
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        if first_write is True:
-            writer.writeheader()
-            first_write = False
-        else:
-            pass
-        if lto_row is not None:
-            writer.writerow({'STATUS': match_status,
-                             'FILENAME': ss_row['Name'],
-                             'FRAMES_MASTER': ss_row['Frames'],
-                             'FRAMES_LTO': lto_row['Frames'],
-                             'SIZE_MASTER': ss_row['Size'],
-                             'SIZE_LTO': lto_row['Size'],
-                             'MD5_MASTER': ss_row['MD5'],
-                             'MD5_LTO': lto_row['MD5'],
-                             'LTO_TAPE': lto_row['Media'],
-                             'ERROR MESSAGES': error_message})
-        else:
-            writer.writerow({'STATUS': match_status,
-                             'FILENAME': ss_row['Name'],
-                             'FRAMES_MASTER': ss_row['Frames'],
-                             'SIZE_MASTER': ss_row['Size'],
-                             'MD5_MASTER': ss_row['MD5'],
-                             'ERROR MESSAGES': error_message})
-    f.close()
+    paths = []
+    for pattern in patterns:
+        matched = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else []
+        paths.extend(matched or [pattern])
+    return paths
 
 
-first_print = True
+def _require_single_lto(lto_paths, option):
+    """
+    Exits when an option that checks a single LTO csv is given several, counted once glob patterns are expanded
+    """
+    if len(lto_paths) > 1:
+        sys.exit("{} takes a single LTO csv, {} were given\nExiting...".format(option, len(lto_paths)))
 
 
-def _results_printer(ss_row, lto_row, match_status, error_message, verbose, debug):
+def _snapshots(args, debug):
     """
-    Prints data to terminal provided by the compare_dicts function
+    Returns the SnapshotCache of the parsed master csvs, or None when snapshots are off or the directory is not
+    writable
     """
-    if verbose is True:
-        global first_print
-        if first_print is True:
-            print("\n\t{: ^6} | {: ^24} {: ^15} {: ^15} {: ^14} {: ^14} {: ^8}  |\n"
-                    "\t       |{: ^98}|"
-                    .format("STATUS",
-                            "FILENAME",
-                            "FRAMES_MASTER",
-                            "FRAMES_LTO",
-                            "SIZE_MASTER",
-                            "SIZE_LTO",
-                            "LTO_TAPE",
-                            " "))
-            first_print = False
-            pass
-        else:
-            pass
-        if lto_row is not None:
-            print("\t{: ^6} | {: ^24} {: ^15} {: ^15} {: ^14} {: ^14} {: ^8}  |\t {}\n"
-                    "\t       |{: ^98}|"
-                    .format(match_status,
-                            ss_row['Name'],
-                            ss_row['Frames'],
-                            lto_row['Frames'],
-                            ss_row['Size'],
-                            lto_row['Size'],
-                            lto_row['Media'],
-                            error_message,
-                            " "))
-        else:
-            print("\t{: ^6} | {: ^24} {: ^15} {: ^15} {: ^14} {: ^14} {: ^8}  |\t {}\n"
-                    "\t       |{: ^98}|"
-                    .format(match_status,
-                            ss_row['Name'],
-                            ss_row['Frames'],
-                            " ",
-                            ss_row['Size'],
-                            " ",
-                            " ",
-                            error_message,
-                            " "))
-
-
-def _summary_printer(int1, int2, int3, int4, int5):
-    print("\nTotal Video Files on Master: {}"
-          "\nTotal Video Files on LTO: {}"
-          "\nMatches: {}"
-          "\nNon-Matches: {}"
-          "\nNot Found: {}"
-          .format(int1, int2, int3, int4, int5))
+    if not args.snapshot_dir:
+        return None
+    import ltocheck_snapshot
+    try:
+        return ltocheck_snapshot.SnapshotCache(args.snapshot_dir, args.snapshot_max_size * 1024 * 1024)
+    except OSError as e:
+        _dprinter("Snapshots disabled: {}".format(e), debug)
+        return None
 
 
 def _dprinter(string, debug=False):
@@ -223,30 +77,171 @@ def _dprinter(string, debug=False):
         return
 
 
-def check(args):
+def _console(args, verbose, debug):
+    """
+    Returns the Console for a run. An interactive terminal gets the live status line (unless debug messages
+    are printed) and, unless --show says otherwise, only the error rows
+    """
+    live = sys.stdout.isatty() and not debug
+    show = args.show or ("errors" if live else "all")
+    return ltocheck_console.Console(sys.stdout, verbose=verbose, show=show, live=live)
+
+
+def _verbosity(args):
+    """
+    Returns the (verbose, debug) flags for the -v count
+    """
     if args.verbose == 1:
-        verbose = True
-        debug = False
+        return True, False
     elif args.verbose >= 2:
-        verbose = True
-        debug = True
-    else:
-        verbose = False
-        debug = False
+        return True, True
+    return False, False
+
+
+def check(args):
+    verbose, debug = _verbosity(args)
     _dprinter("Starting LTO Check w/ DEBUG MODE ACTIVE", debug)
-    _dprinter("Args detected:\nMaster CSV={}\nLTO CSV={}\nOutput Filepath={}\nOutput Filename={}\nVerbose Count={}"
-              .format(args.master_csv_path, args.lto_csv_path, args.out_path,
-                      args.out_name, args.verbose), debug)
-    csv1 = args.master_csv_path
-    csv2 = args.lto_csv_path
+    _dprinter("Args detected:\nMaster CSV={}\nLTO CSV={}\nOutput Filepath={}\nOutput Filename={}\nMatch Mode={}"
+              "\nJobs={}\nMax Memory={}\nCatalog={}\nEngine={}\nSince={}\nSnapshot Dir={}\nShow={}"
+              "\nMetrics JSON={}\nVerbose Count={}"
+              .format(args.master_csv_path, args.lto_csv_path, args.out_path, args.out_name, args.match_mode,
+                      args.jobs, args.max_memory, args.catalog, args.engine, args.since, args.snapshot_dir,
+                      args.show, args.metrics_json, args.verbose), debug)
+    output_file = os.path.join(args.out_path, args.out_name)
+    lto_paths = _expand_paths(args.lto_csv_path or [])
+    if args.max_memory is not None:
+        _require_single_lto(lto_paths, "--max-memory")
+    if args.engine == "columnar":
+        _require_single_lto(lto_paths, "--engine columnar")
+    if args.since is not None:
+        _require_single_lto(lto_paths, "--since")
+
+    def _dlog(message):
+        _dprinter(message, debug)
 
     try:
         _dprinter("Trying...", debug)
-        master_media_files, count_mmf = _read_ss_csv(csv1, debug)
-        lto_media_files, count_lmf = _read_lto_csv(csv2, debug)
-        files_matched, files_non_matched, files_not_found = _compare_dicts(args, master_media_files,
-                                                                           lto_media_files, verbose, debug)
-        _summary_printer(count_mmf, count_lmf, files_matched, files_non_matched, files_not_found)
+        snapshots = _snapshots(args, debug)
+        with ReportWriter(output_file) as report, _console(args, verbose, debug) as console:
+            console.header()
+
+            def _on_row(row):
+                report.write(row)
+                console.row(row)
+
+            if args.since is not None:
+                import ltocheck_incremental
+                delta_file = os.path.join(args.out_path, ltocheck_incremental.delta_name(args.out_name))
+                with ReportWriter(delta_file) as delta:
+                    result = ltocheck_incremental.check_since(args.master_csv_path, lto_paths[0], args.since,
+                                                              args.match_mode, on_row=_on_row,
+                                                              on_changed=delta.write, keep_rows=False, log=_dlog,
+                                                              snapshots=snapshots)
+                result.metrics.split("write delta report", delta.seconds, delta.rows_written)
+            elif args.catalog is not None:
+                import ltocheck_catalog
+                result = ltocheck_catalog.check_catalog(args.master_csv_path, args.catalog, args.match_mode,
+                                                        on_row=_on_row, keep_rows=False, log=_dlog,
+                                                        snapshots=snapshots)
+            elif args.max_memory is not None:
+                import ltocheck_external
+                result = ltocheck_external.check_external(args.master_csv_path, lto_paths[0],
+                                                          args.max_memory * 1024 * 1024, on_row=_on_row, log=_dlog)
+            elif len(lto_paths) > 1:
+                import ltocheck_parallel
+                result = ltocheck_parallel.check_many(args.master_csv_path, lto_paths, args.match_mode,
+                                                      jobs=args.jobs, on_row=_on_row, keep_rows=False, log=_dlog,
+                                                      snapshots=snapshots)
+            elif args.jobs and args.jobs > 1:
+                import ltocheck_parallel
+                result = ltocheck_parallel.check_sharded(args.master_csv_path, lto_paths[0], args.match_mode,
+                                                         jobs=args.jobs, on_row=_on_row, keep_rows=False,
+                                                         log=_dlog)
+            elif args.engine == "columnar":
+                import ltocheck_columnar
+                result = ltocheck_columnar.check_columnar(args.master_csv_path, lto_paths[0], args.match_mode,
+                                                          on_row=_on_row, keep_rows=False, log=_dlog,
+                                                          progress=console.progress, snapshots=snapshots)
+            else:
+                result = ltocheck_engine.check(args.master_csv_path, lto_paths[0], args.match_mode,
+                                               on_row=_on_row, keep_rows=False, log=_dlog,
+                                               progress=console.progress, snapshots=snapshots)
+            _dprinter("Attempting to write output csv to {}".format(output_file), debug)
+            streamed_seconds = report.seconds
+        if args.since is not None:
+            print("{} re-evaluated rows written to {}".format(delta.rows_written, delta_file))
+        _finish(args, result, report, streamed_seconds, "check")
+    except KeyboardInterrupt:
+        _dprinter("Keyboard Interrupt Detected")
+        sys.exit("Exiting...")
+    except FileNotFoundError as e:
+        _dprinter("File not found")
+        sys.exit("File not found: {}\nExiting...".format(str(e).split("'")[-2]))
+    except KeyError as e:
+        _dprinter("Failed to find column")
+        sys.exit('Failed to find column: {}'.format(e))
+    except ltocheck_csvfile.UnsupportedCompression as e:
+        sys.exit("{}\nExiting...".format(e))
+
+
+def index(args):
+    """
+    Loads LTO csvs into the catalog used by checks run with --catalog
+    """
+    import ltocheck_catalog
+    verbose, debug = _verbosity(args)
+
+    def _log(message):
+        if verbose:
+            print(message)
+
+    try:
+        indexed, skipped = ltocheck_catalog.index_files(args.catalog, _expand_paths(args.lto_csv_paths), log=_log)
+        print("\nCatalog: {}\nLTO csvs indexed: {}\nLTO csvs unchanged: {}".format(args.catalog, indexed, skipped))
+    except KeyboardInterrupt:
+        sys.exit("Exiting...")
+    except FileNotFoundError as e:
+        sys.exit("File not found: {}\nExiting...".format(str(e).split("'")[-2]))
+    except KeyError as e:
+        sys.exit('Failed to find column: {}'.format(e))
+    except ltocheck_csvfile.UnsupportedCompression as e:
+        sys.exit("{}\nExiting...".format(e))
+
+
+def verify(args):
+    """
+    Hashes the restored copy of every master clip and reports it against the master csv
+    """
+    import ltocheck_hashcache
+    import ltocheck_verify
+    verbose, debug = _verbosity(args)
+    _dprinter("Starting LTO Check restore verification w/ DEBUG MODE ACTIVE", debug)
+    _dprinter("Args detected:\nMaster CSV={}\nRestore Path={}\nOutput Filepath={}\nOutput Filename={}\nJobs={}"
+              "\nMax Rate={}\nHash Cache={}\nShow={}\nMetrics JSON={}\nVerbose Count={}"
+              .format(args.master_csv_path, args.restore_path, args.out_path, args.out_name, args.jobs,
+                      args.max_rate, args.hash_cache, args.show, args.metrics_json, args.verbose), debug)
+    output_file = os.path.join(args.out_path, args.out_name)
+
+    def _dlog(message):
+        _dprinter(message, debug)
+
+    cache = None
+    try:
+        if args.hash_cache:
+            cache = ltocheck_hashcache.HashCache(args.hash_cache, args.cache_max_entries, args.cache_max_age)
+        with ReportWriter(output_file) as report, _console(args, verbose, debug) as console:
+            console.header()
+
+            def _on_row(row):
+                report.write(row)
+                console.row(row)
+
+            result = ltocheck_verify.verify(args.master_csv_path, args.restore_path, jobs=args.jobs,
+                                            max_rate=args.max_rate * 1e6 if args.max_rate else None, cache=cache,
+                                            on_row=_on_row, keep_rows=False, log=_dlog,
+                                            progress=console.progress)
+            streamed_seconds = report.seconds
+        _finish(args, result, report, streamed_seconds, "verify")
     except KeyboardInterrupt:
         _dprinter("Keyboard Interrupt Detected")
         sys.exit("Exiting...")
@@ -256,3 +251,85 @@ def check(args):
     except KeyError as e:
         _dprinter("Failed to find column")
         sys.exit('Failed to find column: {}'.format(e))
+    except ltocheck_csvfile.UnsupportedCompression as e:
+        sys.exit("{}\nExiting...".format(e))
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+def watch(args):
+    """
+    Re-checks the master csv as LTO csvs land in the watched folder, rewriting the report and printing the summary
+    after every change
+    """
+    import ltocheck_watch
+    verbose, debug = _verbosity(args)
+    _dprinter("Starting LTO Check watch w/ DEBUG MODE ACTIVE", debug)
+    _dprinter("Args detected:\nMaster CSV={}\nWatch Path={}\nPatterns={}\nInterval={}\nOutput Filepath={}"
+              "\nOutput Filename={}\nMatch Mode={}\nSnapshot Dir={}\nVerbose Count={}"
+              .format(args.master_csv_path, args.watch_path, args.pattern, args.interval, args.out_path,
+                      args.out_name, args.match_mode, args.snapshot_dir, args.verbose), debug)
+    if not os.path.isdir(args.watch_path):
+        sys.exit("Folder not found: {}\nExiting...".format(args.watch_path))
+
+    def _log(message):
+        if verbose:
+            print(message)
+
+    def _on_update(result):
+        print("\n[{:%H:%M:%S}] Report written to {}".format(datetime.datetime.now(), watcher.output))
+        print(result.summary())
+        if verbose:
+            print("\n{}".format(result.metrics.summary()))
+
+    snapshots = _snapshots(args, debug)
+    watcher = ltocheck_watch.Watcher(args.master_csv_path, args.watch_path, args.pattern, args.match_mode,
+                                     output=os.path.join(args.out_path, args.out_name), snapshots=snapshots, log=_log)
+    try:
+        if args.once:
+            _on_update(watcher.poll(settle=False))
+        else:
+            print("Watching {} every {}s, Ctrl+C to stop".format(args.watch_path, args.interval))
+            watcher.run(args.interval, _on_update)
+    except KeyboardInterrupt:
+        _dprinter("Keyboard Interrupt Detected")
+        sys.exit("Stopped watching")
+    except FileNotFoundError as e:
+        _dprinter("File not found")
+        sys.exit("File not found: {}\nExiting...".format(str(e).split("'")[-2]))
+    except KeyError as e:
+        _dprinter("Failed to find column")
+        sys.exit('Failed to find column: {}'.format(e))
+    except ltocheck_csvfile.UnsupportedCompression as e:
+        sys.exit("{}\nExiting...".format(e))
+
+
+def serve(args):
+    """
+    Answers checks over local HTTP/JSON until interrupted
+    """
+    import ltocheck_serve
+    import ltocheck_service
+    verbose, debug = _verbosity(args)
+    _dprinter("Args detected:\nHost={}\nPort={}\nCache Size={}\nSnapshot Dir={}\nVerbose Count={}"
+              .format(args.host, args.port, args.cache_size, args.snapshot_dir, args.verbose), debug)
+
+    def _log(message):
+        if verbose:
+            print(message)
+
+    snapshots = _snapshots(args, debug)
+    cache = ltocheck_service.CatalogCache(args.cache_size * 1024 * 1024, snapshots, log=_log)
+    try:
+        server = ltocheck_serve.CheckServer((args.host, args.port), ltocheck_service.CheckService(cache, log=_log))
+    except OSError as e:
+        sys.exit("Cannot listen on {}:{}: {}\nExiting...".format(args.host, args.port, e))
+    print("Serving checks on http://{}:{}/, Ctrl+C to stop".format(args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        _dprinter("Keyboard Interrupt Detected", debug)
+        sys.exit("Stopped serving")
+    finally:
+        server.server_close()
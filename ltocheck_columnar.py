@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+
+"""
+Columnar comparison engine for large catalogs, built on numpy.
+The projected columns of both csvs are loaded into arrays (int64 frame counts and sizes, 16 byte digests as
+uint64 pairs, categorical tape codes), master rows are joined to LTO rows on the sorted clip names, and the
+frame, size and MD5 mismatch masks, the error bitmask and the counts are computed in bulk.
+numpy is optional: without it check_columnar runs the pure Python engine.
+"""
+
+# Import from Python Standard Library
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Import from the package
+import ltocheck_engine
+from ltocheck_engine import CheckResult, LTOSource, RowResult, FRAME_MISMATCH, SIZE_MISMATCH, MD5_MISMATCH, \
+    NOT_FOUND, load_master, log_nothing, progress_reporter, read_sorted
+from ltocheck_index import NameIndex
+from ltocheck_ingest import PROGRESS_ROWS, scan_lto
+
+
+AVAILABLE = numpy is not None
+
+# ints from this size up do not fit an int64 column and are coded like text
+_INT_LIMIT = 2 ** 63
+_NO_DIGEST = bytes(16)
+
+
+class _TextCodes:
+    """
+    Codes the values of a count column that are not plain numbers as negative ints, shared by the master and
+    LTO columns so equal text still compares equal
+    """
+
+    def __init__(self):
+        self.codes = {}
+
+    def code(self, value):
+        if value.__class__ is int and value < _INT_LIMIT:
+            return value
+        return self.codes.setdefault(value, -1 - len(self.codes))
+
+
+class Columns:
+    """
+    The compared columns of a list of records: frames and sizes as int64, MD5 digests as two uint64 halves
+    with a code for MD5 values that are not digests (0 for digests), and for LTO records the tape codes
+    """
+
+    def __init__(self, records, frame_codes, size_codes, md5_codes, tapes=None):
+        count = len(records)
+        self.frames = numpy.fromiter((frame_codes.code(record.frames) for record in records), numpy.int64, count)
+        self.sizes = numpy.fromiter((size_codes.code(record.size) for record in records), numpy.int64, count)
+        md5s = [record.md5 for record in records]
+        digests = b"".join(md5 if md5.__class__ is bytes else _NO_DIGEST for md5 in md5s)
+        self.digests = numpy.frombuffer(digests, dtype=numpy.uint64).reshape(count, 2)
+        self.md5_codes = numpy.fromiter(
+            (0 if md5.__class__ is bytes else md5_codes.setdefault(md5, 1 + len(md5_codes)) for md5 in md5s),
+            numpy.int64, count)
+        self.tapes = None
+        if tapes is not None:
+            self.tapes = numpy.fromiter((tapes.setdefault(record.media, len(tapes)) for record in records),
+                                        numpy.int32, count)
+
+
+def exact_pairs(master_records, lto_records):
+    """
+    Joins the sorted master and LTO records on equal clip names with a binary search of the LTO names.
+    Returns the master position of every output row and the LTO position it is compared to, -1 when not found,
+    in the order the Python engine produces them
+    """
+    # UTF-8 bytes sort in code point order, like the names, at a quarter of the memory of a unicode array
+    master_names = numpy.array([record.name.encode('utf-8', 'surrogatepass') for record in master_records],
+                               dtype=bytes)
+    lto_names = numpy.array([record.name.encode('utf-8', 'surrogatepass') for record in lto_records], dtype=bytes)
+    if not len(lto_names):
+        return numpy.arange(len(master_names)), numpy.full(len(master_names), -1)
+    first = numpy.searchsorted(lto_names, master_names, side='left')
+    counts = numpy.searchsorted(lto_names, master_names, side='right') - first
+    rows = numpy.maximum(counts, 1)
+    master_index = numpy.repeat(numpy.arange(len(master_names)), rows)
+    starts = numpy.cumsum(rows) - rows
+    lto_index = numpy.arange(len(master_index)) - numpy.repeat(starts, rows) + numpy.repeat(first, rows)
+    lto_index[numpy.repeat(counts == 0, rows)] = -1
+    return master_index, lto_index
+
+
+def lookup_pairs(master_records, lto_records, lookup):
+    """
+    Joins master records to LTO records with a NameIndex lookup, for the prefix and contains modes
+    """
+    master_index = []
+    lto_index = []
+    positions = {id(record): position for position, record in enumerate(lto_records)}
+    for position, master in enumerate(master_records):
+        found = lookup(master.name)
+        if found:
+            for lto in found:
+                master_index.append(position)
+                lto_index.append(positions[id(lto)])
+        else:
+            master_index.append(position)
+            lto_index.append(-1)
+    return numpy.array(master_index, dtype=numpy.int64), numpy.array(lto_index, dtype=numpy.int64)
+
+
+def compare_columns(master, lto, master_index, lto_index):
+    """
+    Returns the error bitmask of every output row and the frame, size and MD5 mismatch masks of the rows found
+    """
+    found = lto_index >= 0
+    pairs_master = master_index[found]
+    pairs_lto = lto_index[found]
+    frame_mask = master.frames[pairs_master] != lto.frames[pairs_lto]
+    size_mask = master.sizes[pairs_master] != lto.sizes[pairs_lto]
+    md5_mask = ((master.digests[pairs_master] != lto.digests[pairs_lto]).any(axis=1)
+                | (master.md5_codes[pairs_master] != lto.md5_codes[pairs_lto]))
+    errors = numpy.full(len(master_index), NOT_FOUND, dtype=numpy.int64)
+    errors[found] = frame_mask * FRAME_MISMATCH | size_mask * SIZE_MISMATCH | md5_mask * MD5_MISMATCH
+    return errors, frame_mask, size_mask, md5_mask
+
+
+def check_columnar(master_path, lto_path, match_mode="exact", on_row=None, keep_rows=True, log=None,
+                   progress=None, cancel=None, snapshots=None):
+    """
+    Runs the same check as ltocheck_engine.check with the comparisons done on columns, and returns the
+    CheckResult. Falls back to ltocheck_engine.check when numpy is not installed.
+    snapshots is an optional SnapshotCache for the parsed master csv
+    """
+    log = log or log_nothing
+    if not AVAILABLE:
+        log("numpy is not installed, using the Python engine")
+        return ltocheck_engine.check(master_path, lto_path, match_mode, on_row=on_row, keep_rows=keep_rows,
+                                     log=log, progress=progress, cancel=cancel, snapshots=snapshots)
+    result = CheckResult(keep_rows=keep_rows)
+    master_records = load_master(result, master_path, log, progress_reporter("read master", None, progress, cancel),
+                                 snapshots)
+
+    log("Attempting LTO csv read")
+    scan = scan_lto(lto_path)
+    lto_records = read_sorted(result, scan, "lto", progress_reporter("read lto", None, progress, cancel))
+    result.lto_raw_count = scan.raw_count
+    result.lto_count = len(lto_records)
+    log("LTO csv read and sorted from path {}\n{} files found, {} video files filtered"
+        .format(lto_path, result.lto_raw_count, result.lto_count))
+    source = LTOSource(lto_path, result.lto_raw_count, result.lto_count)
+    result.sources.append(source)
+    report = progress_reporter("compare", result.master_count, progress, cancel)
+
+    log("Attempting to load the compared columns")
+    with result.metrics.phase("load columns") as phase:
+        frame_codes, size_codes, md5_codes = _TextCodes(), _TextCodes(), {}
+        tapes = {}
+        master = Columns(master_records, frame_codes, size_codes, md5_codes)
+        lto = Columns(lto_records, frame_codes, size_codes, md5_codes, tapes)
+        phase.rows = result.master_count + result.lto_count
+
+    log("Attempting to join the csvs on clip names")
+    with result.metrics.phase("join") as phase:
+        if match_mode == "exact":
+            master_index, lto_index = exact_pairs(master_records, lto_records)
+        else:
+            index = NameIndex(lto_records)
+            index.prepare(match_mode)
+            master_index, lto_index = lookup_pairs(master_records, lto_records, index.matcher(match_mode))
+        phase.rows = len(master_index)
+    if report is not None:
+        report(0)
+
+    log("Attempting to compare the columns")
+    with result.metrics.phase("compare") as phase:
+        errors, frame_mask, size_mask, md5_mask = compare_columns(master, lto, master_index, lto_index)
+        not_found = lto_index < 0
+        result.matches = int((errors == 0).sum())
+        result.not_found = int(not_found.sum())
+        result.non_matches = int(frame_mask.sum() + size_mask.sum() + md5_mask.sum())
+        source.errors = int((errors != 0).sum())
+        source.matches = result.matches
+        phase.rows = len(errors)
+    tape_names = list(tapes)
+    found_tapes = lto.tapes[lto_index[~not_found]]
+    for code, (total, failed) in enumerate(zip(numpy.bincount(found_tapes, minlength=len(tape_names)),
+                                               numpy.bincount(found_tapes, weights=errors[~not_found] != 0,
+                                                              minlength=len(tape_names)))):
+        log("Tape {}: {} files compared, {} errors".format(tape_names[code], total, int(failed)))
+
+    with result.metrics.phase("build rows", streams=True) as phase:
+        rows = []
+        for position, (master_position, lto_position, row_errors) in enumerate(
+                zip(master_index.tolist(), lto_index.tolist(), errors.tolist())):
+            row = RowResult(master_records[master_position],
+                            lto_records[lto_position] if lto_position >= 0 else None, row_errors)
+            if keep_rows:
+                rows.append(row)
+            if on_row is not None:
+                on_row(row)
+            if report is not None and position % PROGRESS_ROWS == 0:
+                report(master_position)
+        result.rows = rows
+        phase.rows = len(errors)
+    if report is not None:
+        report(result.master_count)
+    return result
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+"""
+Terminal output of the CLI.
+Verbose result rows are formatted with one precompiled template and written to the terminal in blocks,
+and on an interactive terminal a single status line shows the phase, rows per second and time left.
+"""
+
+# Import from Python Standard Library
+import os
+import sys
+import time
+
+# Import from the package
+
+
+SHOW_CHOICES = ("all", "errors")
+
+BLOCK_ROWS = 1000
+REFRESH_SECONDS = 0.1
+
+_RULE = "\t       |{: ^98}|\n".format(" ")
+_HEADER = ("\n\t{: ^6} | {: ^24} {: ^15} {: ^15} {: ^14} {: ^14} {: ^8}  |\n"
+           .format("STATUS", "FILENAME", "FRAMES_MASTER", "FRAMES_LTO", "SIZE_MASTER", "SIZE_LTO", "LTO_TAPE")
+           + _RULE)
+_ROW = "\t{: ^6} | {: ^24} {: ^15} {: ^15} {: ^14} {: ^14} {: ^8}  |\t {}\n" + _RULE
+
+_CLEAR_LINE = "\r\x1b[K"
+
+
+def format_row(row):
+    """
+    Returns the terminal lines for one RowResult
+    """
+    master = row.master
+    lto = row.lto
+    if lto is not None:
+        return _ROW.format(row.status, master.name, master.frames, lto.frames, master.size, lto.size, lto.media,
+                           row.error_message)
+    return _ROW.format(row.status, master.name, master.frames, " ", master.size, " ", " ", row.error_message)
+
+
+def _terminal_width():
+    try:
+        return os.get_terminal_size().columns
+    except OSError:
+        return 80
+
+
+def _duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return "{}:{:02}:{:02}".format(hours, minutes, seconds)
+
+
+class Console:
+    """
+    Receives result rows and engine progress for the CLI.
+    verbose rows (all of them, or only errors with show="errors") are buffered and written every BLOCK_ROWS rows.
+    With live=True a status line is redrawn at most every REFRESH_SECONDS, and pending rows are written above it
+    at the same pace so errors appear as they are found
+    """
+
+    def __init__(self, stream=None, verbose=False, show="all", live=False):
+        self.stream = stream or sys.stdout
+        self.verbose = verbose
+        self.errors_only = show == "errors"
+        self.live = live
+        self.rows = 0
+        self.errors = 0
+        self.phase = None
+        self.done = 0
+        self.total = None
+        self._phase_started = time.perf_counter()
+        self._rows_started = self._phase_started
+        self._next_refresh = 0
+        self._pending = []
+        self._line_shown = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def header(self):
+        if self.verbose:
+            self.stream.write(_HEADER)
+
+    def row(self, row):
+        """
+        on_row hook for the engine
+        """
+        self.rows += 1
+        if row.errors:
+            self.errors += 1
+        if self.verbose and (row.errors or not self.errors_only):
+            self._pending.append(format_row(row))
+            if not self.live and len(self._pending) >= BLOCK_ROWS:
+                self.flush()
+        if self.live:
+            self._tick()
+
+    def progress(self, phase, done, total):
+        """
+        progress hook for the engine: rows done so far in a phase and the phase total, when known
+        """
+        if phase != self.phase:
+            self.phase = phase
+            self._phase_started = time.perf_counter()
+        self.done = done
+        self.total = total
+        if self.live:
+            self._tick()
+
+    def _tick(self):
+        now = time.monotonic()
+        if now >= self._next_refresh:
+            self._next_refresh = now + REFRESH_SECONDS
+            self.flush()
+
+    def _status(self):
+        now = time.perf_counter()
+        if self.phase is not None:
+            elapsed = now - self._phase_started
+            rate = self.done / elapsed if elapsed else 0
+            status = "{}: {:,}".format(self.phase, self.done)
+            if self.total:
+                status += "/{:,}".format(self.total)
+            status += " ({:,.0f} rows/s)".format(rate)
+            if self.total and rate:
+                status += " ETA {}".format(_duration((self.total - self.done) / rate))
+        else:
+            elapsed = now - self._rows_started
+            status = "{:,.0f} rows/s".format(self.rows / elapsed if elapsed else 0)
+        status += " | {:,} results, {:,} errors".format(self.rows, self.errors)
+        return status[:_terminal_width() - 1]
+
+    def flush(self):
+        """
+        Writes the pending rows in one block, keeping the status line below them on a live terminal
+        """
+        text = "".join(self._pending)
+        self._pending = []
+        if self.live:
+            text = _CLEAR_LINE + text + self._status()
+            self._line_shown = True
+        if text:
+            self.stream.write(text)
+            self.stream.flush()
+
+    def close(self):
+        """
+        Writes the remaining rows and removes the status line
+        """
+        text = "".join(self._pending)
+        self._pending = []
+        if self._line_shown:
+            text = _CLEAR_LINE + text
+            self._line_shown = False
+        if text:
+            self.stream.write(text)
+        self.stream.flush()
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+
+"""
+Opening of csv exports from different tools.
+gzip, bz2, xz and zstd compressed files are recognized by their magic bytes and decompressed as they are read.
+The encoding (BOM, UTF-16 without BOM, UTF-8 or Latin-1) and the delimiter are detected once from the start of
+the file, header spellings are mapped to the canonical column names, and rows are read with a plain csv.reader
+through a large buffer so only the needed columns are picked out of each row.
+Reports are compressed in the same formats when their file name ends in .gz, .bz2, .xz or .zst; the compression
+modules are only imported when a compressed file is opened.
+Uncompressed csvs in a single byte or UTF-8 encoding can be split into byte ranges of whole rows, read on their own.
+"""
+
+# Import from Python Standard Library
+import io
+import re
+import csv
+import codecs
+import importlib
+import collections
+import contextlib
+import importlib.util
+
+# Import from the package
+
+
+SAMPLE_BYTES = 64 * 1024
+SNIFF_LINES = 50
+BUFFER_SIZE = 1024 * 1024
+
+ZSTD_AVAILABLE = importlib.util.find_spec("zstandard") is not None     # zstd is optional
+
+DELIMITERS = ",;\t|"
+FALLBACK_ENCODING = "latin-1"
+
+# utf-32 first: its little endian BOM starts with the utf-16 one
+_BOMS = ((codecs.BOM_UTF32_LE, "utf-32"),
+         (codecs.BOM_UTF32_BE, "utf-32"),
+         (codecs.BOM_UTF8, "utf-8-sig"),
+         (codecs.BOM_UTF16_LE, "utf-16"),
+         (codecs.BOM_UTF16_BE, "utf-16"))
+
+# header spellings accepted for each canonical column, compared lowercase without spaces or punctuation
+HEADER_ALIASES = {
+    "Name": ("name", "filename", "clipname", "clip"),
+    "Frames": ("frames", "framecount", "durationframes", "frameslength"),
+    "File Size": ("filesize", "size", "sizebytes", "filesizebytes", "bytes"),
+    "Size": ("size", "filesize", "sizebytes", "filesizebytes", "bytes"),
+    "MD5": ("md5", "md5checksum", "md5hash", "checksummd5", "md5sum", "checksum"),
+    "Path": ("path", "filepath", "fullpath", "sourcepath", "location"),
+    "Media": ("media", "tape", "tapename", "ltotape", "medianame", "volume", "barcode"),
+}
+
+_PUNCTUATION = re.compile(r"[\W_]+")
+
+# magic bytes of each compression format, bz2 followed by its block size digit
+_MAGIC = ((b"\x1f\x8b", "gzip"),
+          (b"\xfd7zXZ\x00", "xz"),
+          (b"\x28\xb5\x2f\xfd", "zstd"))
+_EXTENSIONS = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz", ".zst": "zstd"}
+_MODULES = {"gzip": "gzip", "bz2": "bz2", "xz": "lzma", "zstd": "zstandard"}
+
+# encodings in which a line break or quote byte is always that character, so a file can be split on them
+_SPLITTABLE_ENCODINGS = ("utf-8", "utf-8-sig", FALLBACK_ENCODING)
+
+# a byte range of whole rows of a csv, with the encoding, delimiter and header row detected from the file's start
+CsvChunk = collections.namedtuple("CsvChunk", "path encoding delimiter header start end")
+
+
+class UnsupportedCompression(Exception):
+    """
+    Raised for zstd compressed files when the zstandard package is not installed
+    """
+
+
+def detect_compression(path):
+    """
+    Returns the compression format of a file from its magic bytes, or None for an uncompressed file
+    """
+    with open(path, 'rb') as f:
+        magic = f.read(6)
+    for prefix, compression in _MAGIC:
+        if magic.startswith(prefix):
+            return compression
+    if magic[:3] == b"BZh" and magic[3:4].isdigit() and magic[3:4] != b"0":
+        return "bz2"
+    return None
+
+
+def compression_of_name(path):
+    """
+    Returns the compression format named by a file extension, or None
+    """
+    for extension, compression in _EXTENSIONS.items():
+        if path.lower().endswith(extension):
+            return compression
+    return None
+
+
+def _opener(compression, path):
+    if compression == "zstd" and not ZSTD_AVAILABLE:
+        raise UnsupportedCompression("{} is zstd compressed: install the zstandard package to use it".format(path))
+    return importlib.import_module(_MODULES[compression]).open
+
+
+def open_binary(path, compression=None):
+    """
+    Opens a file for buffered binary reading, decompressing it as it is read
+    """
+    if compression is None:
+        return open(path, 'rb', buffering=BUFFER_SIZE)
+    return io.BufferedReader(_opener(compression, path)(path, 'rb'), BUFFER_SIZE)
+
+
+def open_output(path):
+    """
+    Opens a text file for writing, compressed when its extension names a compression format
+    """
+    compression = compression_of_name(path)
+    if compression is None:
+        return open(path, 'w', buffering=BUFFER_SIZE)
+    return io.TextIOWrapper(io.BufferedWriter(_opener(compression, path)(path, 'wb'), BUFFER_SIZE))
+
+
+def detect_encoding(sample, complete=False):
+    """
+    Returns the encoding of a file from its first bytes: the one its BOM names, UTF-16 when every other byte is
+    NUL, UTF-8 when the sample decodes as UTF-8, otherwise Latin-1.
+    complete is True when the sample is the whole file
+    """
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
+    if b"\x00" in sample:
+        even_nuls = sample[0::2].count(0)
+        odd_nuls = sample[1::2].count(0)
+        if odd_nuls > even_nuls:
+            return "utf-16-le"
+        if even_nuls > odd_nuls:
+            return "utf-16-be"
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=complete)
+    except UnicodeDecodeError:
+        return FALLBACK_ENCODING
+    return "utf-8"
+
+
+def detect_delimiter(text):
+    """
+    Returns the delimiter of the csv lines in text, a comma when it cannot be told
+    """
+    lines = text.splitlines(True)[:SNIFF_LINES]
+    if len(lines) > 1 and not text.endswith(("\n", "\r")):
+        lines.pop()     # the sample may end part way through a line
+    try:
+        return csv.Sniffer().sniff("".join(lines), DELIMITERS).delimiter
+    except csv.Error:
+        return ","
+
+
+def _normalize(header):
+    return _PUNCTUATION.sub("", header).lower()
+
+
+def column_indices(header, fields):
+    """
+    Returns the position in the header row of each canonical field, matching the exact name first and then its
+    aliases in order. The last of repeated headers is used, as csv.DictReader does.
+    Raises KeyError with the field name when a field is missing
+    """
+    exact = {}
+    normalized = {}
+    for position, name in enumerate(header):
+        exact[name.strip()] = position
+        normalized[_normalize(name)] = position
+    indices = []
+    for field in fields:
+        if field in exact:
+            indices.append(exact[field])
+            continue
+        for alias in HEADER_ALIASES.get(field, (_normalize(field),)):
+            if alias in normalized:
+                indices.append(normalized[alias])
+                break
+        else:
+            raise KeyError(field)
+    return indices
+
+
+@contextlib.contextmanager
+def open_csv(path):
+    """
+    Opens a csv export, detecting its compression, encoding and delimiter, and yields a csv.reader over its rows
+    """
+    compression = detect_compression(path)
+    with open_binary(path, compression) as f:
+        sample = f.read(SAMPLE_BYTES)
+    encoding = detect_encoding(sample, len(sample) < SAMPLE_BYTES)
+    delimiter = detect_delimiter(sample.decode(encoding, errors='ignore'))
+    with io.TextIOWrapper(open_binary(path, compression), encoding=encoding, newline='') as f:
+        yield csv.reader(f, csv.excel, delimiter=delimiter)
+
+
+def _row_end(f, quotes=0):
+    """
+    Reads on to the end of the current row, past line breaks inside quoted fields; quotes is the number of quote
+    characters already read in the row. Returns the offset after the row
+    """
+    while True:
+        line = f.readline()
+        quotes += line.count(b'"')
+        if not line or quotes % 2 == 0:
+            return f.tell()
+
+
+def _count_quotes(f, start, end):
+    f.seek(start)
+    count = 0
+    while start < end:
+        block = f.read(min(BUFFER_SIZE, end - start))
+        if not block:
+            break
+        count += block.count(b'"')
+        start += len(block)
+    return count
+
+
+def split_csv(path, parts):
+    """
+    Splits the rows of an uncompressed csv after its header row into up to parts byte ranges of about the same
+    size. Each boundary is moved to the next line break outside a quoted field, found from the number of quote
+    characters before it, so every range holds whole rows.
+    Returns a list of CsvChunk in file order, or None when the file is compressed or its encoding has multi-byte
+    line breaks (UTF-16, UTF-32)
+    """
+    if detect_compression(path) is not None:
+        return None
+    with open(path, 'rb', buffering=BUFFER_SIZE) as f:
+        sample = f.read(SAMPLE_BYTES)
+        encoding = detect_encoding(sample, len(sample) < SAMPLE_BYTES)
+        if encoding not in _SPLITTABLE_ENCODINGS:
+            return None
+        delimiter = detect_delimiter(sample.decode(encoding, errors='ignore'))
+        f.seek(0)
+        start = _row_end(f)
+        f.seek(0)
+        header_text = f.read(start).decode(encoding)
+        header = next(csv.reader(io.StringIO(header_text, newline=''), csv.excel, delimiter=delimiter), None)
+        size = f.seek(0, io.SEEK_END)
+        base = start
+        chunks = []
+        for part in range(1, parts + 1):
+            end = size
+            if part < parts:
+                f.seek(max(start, base + (size - base) * part // parts - 1))
+                f.readline()
+                end = f.tell()
+                if _count_quotes(f, start, end) % 2:
+                    end = _row_end(f, 1)
+            if end > start:
+                chunks.append(CsvChunk(path, encoding, delimiter, header, start, end))
+                start = end
+    return chunks
+
+
+class _RangeReader(io.RawIOBase):
+    """
+    Raw reader of one byte range of a file
+    """
+
+    def __init__(self, f, start, end):
+        self.f = f
+        self.f.seek(start)
+        self.remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.remaining <= 0:
+            return 0
+        count = self.f.readinto(memoryview(buffer)[:min(len(buffer), self.remaining)])
+        self.remaining -= count
+        return count
+
+
+@contextlib.contextmanager
+def open_chunk(chunk):
+    """
+    Opens the byte range of a CsvChunk and yields a csv.reader over its rows
+    """
+    with open(chunk.path, 'rb', buffering=0) as f:
+        raw = io.BufferedReader(_RangeReader(f, chunk.start, chunk.end), BUFFER_SIZE)
+        with io.TextIOWrapper(raw, encoding=chunk.encoding, newline='') as text:
+            yield csv.reader(text, csv.excel, delimiter=chunk.delimiter)
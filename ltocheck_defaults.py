@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+
+"""
+Default paths and limits of the optional features.
+Kept apart from the modules using them, which import sqlite3, pickle or http.server or build on the whole engine, so the
+argument parser can show them without loading those modules.
+"""
+
+# Import from Python Standard Library
+import os
+
+# Import from the package
+
+
+LTOCHECK_DIR = os.path.join(os.path.expanduser("~"), ".ltocheck")
+
+DEFAULT_CATALOG = os.path.join(LTOCHECK_DIR, "catalog.sqlite")
+
+DEFAULT_HASH_CACHE = os.path.join(LTOCHECK_DIR, "hashes.sqlite")
+DEFAULT_HASH_CACHE_MAX_ENTRIES = 1000000
+DEFAULT_HASH_CACHE_MAX_AGE_DAYS = 90
+
+DEFAULT_SNAPSHOT_DIR = os.path.join(LTOCHECK_DIR, "snapshots")
+DEFAULT_SNAPSHOT_MAX_MB = 1024
+
+DEFAULT_WATCH_INTERVAL = 5.0
+DEFAULT_WATCH_PATTERNS = ("*.csv", "*.csv.gz", "*.csv.bz2", "*.csv.xz", "*.csv.zst")
+
+DEFAULT_SERVE_HOST = "127.0.0.1"
+DEFAULT_SERVE_PORT = 8765
+DEFAULT_SERVE_CACHE_MB = 2048
+
+
+def shown_path(path):
+    """
+    Returns a path with the home folder written as ~, as the help shows default paths the same on every machine
+    """
+    home = os.path.expanduser("~")
+    if path == home or path.startswith(home + os.sep):
+        return "~" + path[len(home):]
+    return path
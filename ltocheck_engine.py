@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+
+"""
+Comparison core shared by the CLI and GUI.
+Reads both csvs, joins master records to LTO records through the name index and returns a CheckResult
+holding the per-row outcomes, counts and phase timings.
+"""
+
+# Import from Python Standard Library
+
+# Import from the package
+from ltocheck_index import NameIndex
+from ltocheck_ingest import PROGRESS_ROWS, collect, scan_master, scan_lto, sort_collected
+from ltocheck_metrics import Metrics
+
+
+MATCH = "MATCH"
+ERROR = "ERROR"
+
+FRAME_MISMATCH = 1
+SIZE_MISMATCH = 2
+MD5_MISMATCH = 4
+NOT_FOUND = 8
+READ_ERROR = 16
+
+ERROR_MESSAGES = ((FRAME_MISMATCH, "FRAME COUNT MISMATCH \t"),
+                  (SIZE_MISMATCH, "SIZE MISMATCH \t"),
+                  (MD5_MISMATCH, "MD5 MISMATCH \t"),
+                  (NOT_FOUND, "FILE NOT FOUND"),
+                  (READ_ERROR, "READ ERROR"))
+
+# comparison engines for a single LTO csv: this module's check, or ltocheck_columnar's
+ENGINES = ("python", "columnar")
+
+
+class CheckCancelled(Exception):
+    """
+    Raised from inside a check when its cancel event is set
+    """
+
+
+class RowResult:
+    """
+    Outcome for one master record: the LTO record it was compared to (None when not found)
+    and a bitmask of the checks that failed
+    """
+    __slots__ = ('master', 'lto', 'errors')
+
+    def __init__(self, master, lto, errors):
+        self.master = master
+        self.lto = lto
+        self.errors = errors
+
+    @property
+    def status(self):
+        return ERROR if self.errors else MATCH
+
+    @property
+    def error_message(self):
+        return "".join(message for flag, message in ERROR_MESSAGES if self.errors & flag)
+
+
+class LTOSource:
+    """
+    Per LTO csv counts, used for the per-tape summary when several LTO csvs are checked at once
+    """
+
+    def __init__(self, path, raw_count=0, count=0):
+        self.path = path
+        self.raw_count = raw_count
+        self.count = count
+        self.matches = 0
+        self.errors = 0
+
+    def add(self, row):
+        if row.errors:
+            self.errors += 1
+        else:
+            self.matches += 1
+
+
+class CheckResult:
+    """
+    Collects the row outcomes of a check with the counts reported in the summary.
+    non_matches counts failed checks, so a row with a size and an MD5 mismatch adds two.
+    """
+
+    def __init__(self, master_count=0, lto_count=0, keep_rows=True):
+        self.master_count = master_count
+        self.lto_count = lto_count
+        self.master_raw_count = 0
+        self.lto_raw_count = 0
+        self.matches = 0
+        self.non_matches = 0
+        self.not_found = 0
+        self.metrics = Metrics()
+        self.timings = self.metrics.timings
+        self.sources = []
+        self.keep_rows = keep_rows
+        self.rows = []
+
+    def add(self, row, source=None):
+        errors = row.errors
+        if source is not None:
+            source.add(row)
+        if not errors:
+            self.matches += 1
+        elif errors & NOT_FOUND:
+            self.not_found += 1
+        else:
+            self.non_matches += bin(errors).count("1")
+        if self.keep_rows:
+            self.rows.append(row)
+
+    def summary(self):
+        summary = ("Total Video Files on Master: {}"
+                   "\nTotal Video Files on LTO: {}"
+                   "\nMatches: {}"
+                   "\nNon-Matches: {}"
+                   "\nNot Found: {}"
+                   .format(self.master_count, self.lto_count, self.matches, self.non_matches, self.not_found))
+        if len(self.sources) > 1:
+            summary += "\n\n{: <40} {: >12} {: >10} {: >10}".format("LTO csv", "Video Files", "Matches", "Errors")
+            for source in self.sources:
+                summary += "\n{: <40} {: >12} {: >10} {: >10}".format(source.path, source.count,
+                                                                      source.matches, source.errors)
+        return summary
+
+
+def compare_records(master, lto):
+    """
+    Returns the bitmask of failed checks between a master record and an LTO record, 0 for a match
+    """
+    errors = 0
+    if master.frames != lto.frames:
+        errors |= FRAME_MISMATCH
+    if master.size != lto.size:
+        errors |= SIZE_MISMATCH
+    if master.md5 != lto.md5:
+        errors |= MD5_MISMATCH
+    return errors
+
+
+def iter_results(master_records, lookup):
+    """
+    Yields a RowResult per matching LTO record for each master record, in master order,
+    or a single not found result when the lookup returns nothing
+    """
+    for master in master_records:
+        found = False
+        for lto in lookup(master.name):
+            found = True
+            yield RowResult(master, lto, compare_records(master, lto))
+        if not found:
+            yield RowResult(master, None, NOT_FOUND)
+
+
+def log_nothing(message):
+    return
+
+
+def progress_reporter(phase, total=None, progress=None, cancel=None):
+    """
+    Returns a callback taking the number of rows done in a phase, which raises CheckCancelled once cancel
+    (a threading.Event) is set and otherwise forwards (phase, done, total) to progress.
+    Returns None when there is neither a progress callback nor a cancel event
+    """
+    if progress is None and cancel is None:
+        return None
+
+    def report(done):
+        if cancel is not None and cancel.is_set():
+            raise CheckCancelled(phase)
+        if progress is not None:
+            progress(phase, done, total)
+    return report
+
+
+def read_sorted(result, scan, name, report=None, snapshots=None):
+    """
+    Reads a scan and sorts its records, timing both as phases of the result. Returns the sorted records.
+    snapshots is an optional SnapshotCache: the records are loaded from it when the csv is unchanged since they
+    were saved, and saved to it otherwise
+    """
+    if snapshots is not None:
+        with result.metrics.phase("load {} snapshot".format(name)) as phase:
+            key = snapshots.key(scan, name)
+            records = snapshots.load(key, scan)
+            phase.rows = None if records is None else len(records)
+        if records is not None:
+            return records
+    with result.metrics.phase("read " + name) as phase:
+        keyed = collect(scan, report)
+        phase.rows = scan.raw_count
+    with result.metrics.phase("sort " + name) as phase:
+        records = sort_collected(keyed)
+        phase.rows = len(records)
+    if snapshots is not None:
+        with result.metrics.phase("save {} snapshot".format(name)) as phase:
+            snapshots.save(key, scan, name, records)
+            phase.rows = len(records)
+    return records
+
+
+def load_master(result, master_path, log, report=None, snapshots=None):
+    """
+    Reads the master csv into records, recording counts and timing on the result.
+    report is an optional progress_reporter callback for the rows read, and snapshots an optional SnapshotCache
+    the sorted records are loaded from or saved to
+    """
+    log("Attempting master csv read")
+    scan = scan_master(master_path)
+    hits = snapshots.hits if snapshots is not None else 0
+    master_records = read_sorted(result, scan, "master", report, snapshots)
+    result.master_raw_count = scan.raw_count
+    result.master_count = len(master_records)
+    log("Master csv {} from path {}\n{} files found, {} video files filtered"
+        .format("loaded from snapshot" if snapshots is not None and snapshots.hits > hits else "read and sorted",
+                master_path, result.master_raw_count, result.master_count))
+    return master_records
+
+
+def load_lto(result, lto_path, log, report=None):
+    """
+    Reads an LTO csv into sorted records, recording counts and timing on the result.
+    report is an optional progress_reporter callback for the rows read
+    """
+    log("Attempting LTO csv read")
+    scan = scan_lto(lto_path)
+    lto_records = read_sorted(result, scan, "lto", report)
+    result.lto_raw_count = scan.raw_count
+    result.lto_count = len(lto_records)
+    log("LTO csv read and sorted from path {}\n{} files found, {} video files filtered"
+        .format(lto_path, result.lto_raw_count, result.lto_count))
+    return lto_records
+
+
+def compare_index(result, master_records, index, source, match_mode, on_row=None, report=None):
+    """
+    Matches every master record against the name index of an LTO csv in the streaming "compare" phase,
+    adding each RowResult to the result and the csv's LTOSource and passing it to on_row.
+    report is an optional progress_reporter callback for the master records compared
+    """
+    lookup = index.matcher(match_mode)
+    with result.metrics.phase("compare", streams=True) as phase:
+        if report is None:
+            for row in iter_results(master_records, lookup):
+                result.add(row, source)
+                if on_row is not None:
+                    on_row(row)
+        else:
+            compared = 0
+            master = None
+            report(0)
+            for row in iter_results(master_records, lookup):
+                if row.master is not master:
+                    master = row.master
+                    compared += 1
+                    if compared % PROGRESS_ROWS == 0:
+                        report(compared)
+                result.add(row, source)
+                if on_row is not None:
+                    on_row(row)
+            report(compared)
+        phase.rows = len(master_records)
+
+
+def check(master_path, lto_path, match_mode="exact", on_row=None, keep_rows=True, log=None, progress=None,
+          cancel=None, snapshots=None):
+    """
+    Runs a full check of a master csv against an LTO csv and returns the CheckResult.
+    on_row is called with every RowResult as it is produced; keep_rows=False avoids holding them all in memory.
+    log receives progress messages and progress, when given, is called with (phase, rows done, total rows or None)
+    as rows are read and master records are matched. Setting the cancel event stops the check with CheckCancelled.
+    snapshots is an optional SnapshotCache for the parsed master csv
+    """
+    log = log or log_nothing
+    result = CheckResult(keep_rows=keep_rows)
+    master_records = load_master(result, master_path, log, progress_reporter("read master", None, progress, cancel),
+                                 snapshots)
+
+    lto_records = load_lto(result, lto_path, log, progress_reporter("read lto", None, progress, cancel))
+    source = LTOSource(lto_path, result.lto_raw_count, result.lto_count)
+    result.sources.append(source)
+
+    log("Attempting compare the csvs")
+    with result.metrics.phase("index") as phase:
+        index = NameIndex(lto_records)
+        index.prepare(match_mode)
+        phase.rows = result.lto_count
+    compare_index(result, master_records, index, source, match_mode, on_row,
+                  progress_reporter("compare", result.master_count, progress, cancel))
+    return result
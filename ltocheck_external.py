@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+"""
+Out-of-core check for catalogs larger than memory.
+Each csv is sorted by clip name under a memory budget, spilling sorted runs to temporary files when the budget
+is exceeded and merging at most MERGE_FAN_IN runs at a time, and the two sorted streams are then merge-joined in a
+single sequential pass.
+"""
+
+# Import from Python Standard Library
+import os
+import sys
+import heapq
+import pickle
+import operator
+import itertools
+import tempfile
+
+# Import from the package
+from ltocheck_engine import CheckResult, LTOSource, RowResult, NOT_FOUND, compare_records, log_nothing
+from ltocheck_ingest import scan_master, scan_lto
+
+
+RUN_BLOCK = 1024
+
+# runs merged at once; runs are only open while they are merged, so both csvs together stay well under the
+# default open file limits (256 on macOS)
+MERGE_FAN_IN = 16
+
+# tuple, sequence number and list slot overhead per buffered item, on top of the record and its strings
+_ITEM_OVERHEAD = 160
+
+
+def _item_bytes(record, raw_name):
+    return (sys.getsizeof(record) + sys.getsizeof(record.name) + sys.getsizeof(raw_name)
+            + sys.getsizeof(record.md5) + _ITEM_OVERHEAD)
+
+
+def _spill(items, tmpdir):
+    """
+    Writes one sorted run of items in blocks to a file in tmpdir, closed once written, and returns its path
+    """
+    descriptor, path = tempfile.mkstemp(dir=tmpdir)
+    with open(descriptor, 'wb') as run:
+        items = iter(items)
+        while True:
+            block = list(itertools.islice(items, RUN_BLOCK))
+            if not block:
+                break
+            pickle.dump(block, run, pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def _read_run(path):
+    """
+    Yields the items of a run, removing its file once it is read
+    """
+    with open(path, 'rb') as run:
+        while True:
+            try:
+                block = pickle.load(run)
+            except EOFError:
+                break
+            yield from block
+    os.remove(path)
+
+
+def _merge_runs(runs, key):
+    return heapq.merge(*(_read_run(run) for run in runs), key=key)
+
+
+def _add_run(levels, run, key, tmpdir):
+    """
+    Adds a sorted run to the runs kept per merge level. A level reaching MERGE_FAN_IN runs is merged into one run
+    of the next level, so each run is rewritten once per level and no merge reads more than MERGE_FAN_IN runs
+    """
+    level = 0
+    while True:
+        if level == len(levels):
+            levels.append([])
+        levels[level].append(run)
+        if len(levels[level]) < MERGE_FAN_IN:
+            return
+        run = _spill(_merge_runs(levels[level], key), tmpdir)
+        levels[level] = []
+        level += 1
+
+
+def sorted_records(scan, budget, tmpdir):
+    """
+    Yields the records of a scan ordered by clip name, full file name then file order, as the in-memory readers
+    sort them, holding at most about budget bytes of records at a time
+    """
+    key = operator.itemgetter(0, 1, 2)
+    levels = []
+    items = []
+    used = 0
+    for sequence, (record, raw_name) in enumerate(scan):
+        items.append((record.name, raw_name, sequence, record))
+        used += _item_bytes(record, raw_name)
+        if used >= budget:
+            items.sort(key=key)
+            _add_run(levels, _spill(items, tmpdir), key, tmpdir)
+            items = []
+            used = 0
+    items.sort(key=key)
+    if not levels:
+        merged = iter(items)
+    else:
+        runs = [run for level in levels for run in level] + [_spill(items, tmpdir)]
+        items = []
+        # the sequence number makes every key unique, so runs can be merged in any grouping
+        while len(runs) > MERGE_FAN_IN:
+            runs = [_spill(_merge_runs(runs[:MERGE_FAN_IN], key), tmpdir)] + runs[MERGE_FAN_IN:]
+        merged = _merge_runs(runs, key)
+    for item in merged:
+        yield item[3]
+
+
+def merge_join(master_records, lto_records):
+    """
+    Yields RowResults for two streams sorted by clip name, matching names exactly.
+    Only the LTO records sharing the current master name are held in memory
+    """
+    lto_records = iter(lto_records)
+    lto = next(lto_records, None)
+    group_name = None
+    group = []
+    for master in master_records:
+        name = master.name
+        if name != group_name:
+            while lto is not None and lto.name < name:
+                lto = next(lto_records, None)
+            group = []
+            while lto is not None and lto.name == name:
+                group.append(lto)
+                lto = next(lto_records, None)
+            group_name = name
+        if group:
+            for match in group:
+                yield RowResult(master, match, compare_records(master, match))
+        else:
+            yield RowResult(master, None, NOT_FOUND)
+
+
+def _counted(records, result, attribute):
+    for record in records:
+        setattr(result, attribute, getattr(result, attribute) + 1)
+        yield record
+
+
+def check_external(master_path, lto_path, max_memory, on_row=None, log=None):
+    """
+    Runs an exact name match check with memory bounded by max_memory bytes and returns the CheckResult.
+    The rows are always streamed to on_row rather than kept on the result
+    """
+    log = log or log_nothing
+    result = CheckResult(keep_rows=False)
+    budget = max_memory // 2
+    master_scan = scan_master(master_path)
+    lto_scan = scan_lto(lto_path)
+    source = LTOSource(lto_path)
+    result.sources.append(source)
+    with result.metrics.phase("sort and merge", streams=True) as phase, \
+            tempfile.TemporaryDirectory(prefix="ltocheck_") as tmpdir:
+        log("Sorting master and LTO csvs in {} byte runs under {}".format(budget, tmpdir))
+        master_records = _counted(sorted_records(master_scan, budget, tmpdir), result, "master_count")
+        lto_records = _counted(sorted_records(lto_scan, budget, tmpdir), result, "lto_count")
+        for row in merge_join(master_records, lto_records):
+            result.add(row, source)
+            if on_row is not None:
+                on_row(row)
+        # LTO records past the last master name still count towards the totals
+        for _ in lto_records:
+            pass
+        phase.rows = master_scan.raw_count + lto_scan.raw_count
+    result.master_raw_count = master_scan.raw_count
+    result.lto_raw_count = source.raw_count = lto_scan.raw_count
+    source.count = result.lto_count
+    log("Master csv read from path {}\n{} files found, {} video files filtered"
+        .format(master_path, result.master_raw_count, result.master_count))
+    log("LTO csv read from path {}\n{} files found, {} video files filtered"
+        .format(lto_path, result.lto_raw_count, result.lto_count))
+    return result
+
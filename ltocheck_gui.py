@@ -6,168 +6,39 @@ Compares file size, frame quantity and MD5 Hash.
 """
 
 # Import from Python Standard Library
-import csv
 import sys
-import collections
+import time
+import queue
+import threading
 
 # Import from the package
+import ltocheck_engine
+from ltocheck_report import COLUMN_VALUES, FIELDNAMES, ReportWriter, report_line
+from ltocheck_snapshot import SnapshotCache
 
 
-def _read_ss_csv(input_file):
-    """
-    Opens a SS csv as a dictionary with header as key, sorts by given column key, outputs filtered dictionary
-    """
-    print("Attempting master csv read")
-    with open(input_file, 'r') as f:
-        reader = csv.DictReader(f)
-        reader = sorted(reader, key=lambda row: row['Name'])
-        filtered_dict = []
-
-        def _filter_dict_ss(row):
-            if row['Frames'] is not "" \
-                    and row['Frames'] is not "1":
-                return row
-
-        for row in filter(_filter_dict_ss, reader):
-            filtered_row = collections.OrderedDict([("Name", row['Name'].split('.')[0]),
-                                                    ("Frames", row['Frames']),
-                                                    ("Size", row['File Size']),
-                                                    ("MD5", row['MD5'])])
-            filtered_dict.append(filtered_row)
-    f.close()
-    print("Master csv read and sorted from path {}\n{} files found, {} video files filtered"
-              .format(input_file, len(reader), len(filtered_dict)))
-    return filtered_dict, len(filtered_dict)
-
-
-def _read_lto_csv(input_file):
-    """
-    Opens an LTO csv as a dictionary with header as key, sorts by given column key, outputs filtered dictionary
-    """
-    print("Attempting LTO csv read")
-    with open(input_file, 'r') as f:
-        reader = csv.DictReader(f)
-        reader = sorted(reader, key=lambda row: row['Name'])
-        filtered_dict = []
-
-        def _filter_dict_lto(row):
-            if "CAMERA_MASTER" in row['Path'] \
-                    and row['Frames'] is not "" \
-                    and row['Frames'] is not "1":
-                return row
-
-        for row in filter(_filter_dict_lto, reader):
-            filtered_row = collections.OrderedDict([("Name", row['Name'].split('.')[0]),
-                                                    ("Frames", row['Frames']),
-                                                    ("Size", row['Size']),
-                                                    ("MD5", row['MD5']),
-                                                    ("Media", row['Media'])])
-            filtered_dict.append(filtered_row)
-    f.close()
-    print("LTO csv read and sorted from path {}\n{} files found, {} video files filtered"
-              .format(input_file, len(reader), len(filtered_dict)))
-    return filtered_dict, len(filtered_dict)
-
-
-def _compare_dicts(ss_dict, lto_dict):
-    """
-    Compares two given dictionaries, returns quanity of matches, non matches and not found files
-    as well as outputting data to the results printer func and csv creator
-    """
-    print("Attempting compare the csvs")
-    match = 0
-    non_match = 0
-    not_found = 0
-    results_dict = []
-    for ss_row in ss_dict:
-        file_found = False
-        for lto_row in lto_dict:
-            if ss_row['Name'] == lto_row['Name']:
-                file_found = True
-                match_status = ""
-                error_message = ""
-                if ss_row["Frames"] == lto_row["Frames"] \
-                        and ss_row["Size"] == lto_row["Size"] \
-                        and ss_row["MD5"].upper() == lto_row["MD5"].upper():
-                    match += 1
-                    match_status = "MATCH"
-                else:
-                    if ss_row["Frames"] != lto_row["Frames"]:
-                        non_match += 1
-                        match_status = "ERROR"
-                        error_message += "FRAME COUNT MISMATCH \t"
-                    if ss_row["Size"] != lto_row["Size"]:
-                        non_match += 1
-                        match_status = "ERROR"
-                        error_message += "SIZE MISMATCH \t"
-                    if ss_row["MD5"] != lto_row["MD5"]:
-                        non_match += 1
-                        match_status = "ERROR"
-                        error_message += "MD5 MISMATCH \t"
-                results_dict.append(collections.OrderedDict({'STATUS': match_status,
-                                                             'FILENAME': ss_row['Name'],
-                                                             'FRAMES_MASTER': ss_row['Frames'],
-                                                             'FRAMES_LTO': lto_row['Frames'],
-                                                             'SIZE_MASTER': ss_row['Size'],
-                                                             'SIZE_LTO': lto_row['Size'],
-                                                             'MD5_MASTER': ss_row['MD5'],
-                                                             'MD5_LTO': lto_row['MD5'],
-                                                             'LTO_TAPE': lto_row['Media'],
-                                                             'ERROR MESSAGES': error_message}))
-        if file_found is False:
-            not_found += 1
-            match_status = "ERROR"
-            error_message = "FILE NOT FOUND"
-            results_dict.append(collections.OrderedDict({'STATUS': match_status,
-                                                         'FILENAME': ss_row['Name'],
-                                                         'FRAMES_MASTER': ss_row['Frames'],
-                                                         'SIZE_MASTER': ss_row['Size'],
-                                                         'MD5_MASTER': ss_row['MD5'],
-                                                         'ERROR MESSAGES': error_message}))
-    return match, non_match, not_found, results_dict
-
-
-first_write = True
-
-
-def write_csv(output_filepath, results_dict):
-    print("Attempting to write output csv to {}".format(output_filepath))
-    fieldnames = ["STATUS",
-                  "FILENAME",
-                  "FRAMES_MASTER",
-                  "FRAMES_LTO",
-                  "SIZE_MASTER",
-                  "SIZE_LTO",
-                  "MD5_MASTER",
-                  "MD5_LTO",
-                  "LTO_TAPE",
-                  "ERROR MESSAGES"]
-    writer = csv.DictWriter(output_filepath, fieldnames=fieldnames)
-    writer.writeheader()
-    writer.writerows(results_dict)
-    output_filepath.close()
+# rows handed to the window per message while a check runs
+ROW_BATCH = 500
+
+ALL = "All"
+ERROR_FILTERS = [(message.strip(), flag) for flag, message in ltocheck_engine.ERROR_MESSAGES]
 
 
-def results(int1, int2, int3, int4, int5):
-    result = ("Total Video Files on Master: {}"
-          "\nTotal Video Files on LTO: {}"
-          "\nMatches: {}"
-          "\nNon-Matches: {}"
-          "\nNot Found: {}"
-          .format(int1, int2, int3, int4, int5))
-    return result
+def write_csv(output_filepath, result):
+    print("Attempting to write output csv to {}".format(output_filepath))
+    with ReportWriter(output_filepath) as writer:
+        writer.write_rows(result.rows)
+    output_filepath.close()
 
 
 def check(csv1, csv2):
+    """
+    Runs an exact name match check and returns the CheckResult, or None when the csvs could not be read
+    """
     print(csv1)
     print(csv2)
     try:
-        master_media_files, count_mmf = _read_ss_csv(csv1)
-        lto_media_files, count_lmf = _read_lto_csv(csv2)
-        files_matched, files_non_matched, files_not_found, results_report = _compare_dicts(master_media_files,
-                                                                                           lto_media_files)
-        results_summary = results(count_mmf, count_lmf, files_matched, files_non_matched, files_not_found)
-        return results_summary, results_report
+        return ltocheck_engine.check(csv1, csv2, "exact", log=print)
     except KeyboardInterrupt:
         sys.exit("Exiting...")
     except FileNotFoundError as e:
@@ -176,5 +47,170 @@ def check(csv1, csv2):
         print('Failed to find column: {}'.format(e))
 
 
+class CheckWorker:
+    """
+    Runs an exact name match check on a background thread so the window stays responsive.
+    Everything the window needs is posted to the messages queue, which the Tk loop drains with after():
+        ("progress", phase, rows done, total rows or None, rows per second, seconds left or None)
+        ("rows", [RowResult, ...]) as batches of results are produced
+        ("done", CheckResult), ("cancelled", None) or ("failed", message) once the check ends
+    """
+
+    def __init__(self, csv1, csv2):
+        self.csv1 = csv1
+        self.csv2 = csv2
+        self.messages = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="ltocheck-worker", daemon=True)
+        self._batch = []
+        self._phase = None
+        self._phase_started = None
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def running(self):
+        return self.thread.is_alive()
+
+    def _on_row(self, row):
+        self._batch.append(row)
+        if len(self._batch) >= ROW_BATCH:
+            self._post_rows()
+
+    def _post_rows(self):
+        if self._batch:
+            self.messages.put(("rows", self._batch))
+            self._batch = []
+
+    def _on_progress(self, phase, done, total):
+        now = time.perf_counter()
+        if phase != self._phase:
+            self._phase = phase
+            self._phase_started = now
+        elapsed = now - self._phase_started
+        rate = done / elapsed if elapsed else 0
+        eta = (total - done) / rate if total is not None and rate else None
+        self._post_rows()
+        self.messages.put(("progress", phase, done, total, rate, eta))
+
+    def _run(self):
+        print(self.csv1)
+        print(self.csv2)
+        try:
+            snapshots = SnapshotCache()
+        except OSError:     # no writable snapshot directory: parse the master csv every time
+            snapshots = None
+        try:
+            result = ltocheck_engine.check(self.csv1, self.csv2, "exact", on_row=self._on_row, log=print,
+                                           progress=self._on_progress, cancel=self.cancel_event,
+                                           snapshots=snapshots)
+            self._post_rows()
+            self.messages.put(("done", result))
+        except ltocheck_engine.CheckCancelled:
+            print("Check cancelled")
+            self.messages.put(("cancelled", None))
+        except FileNotFoundError as e:
+            self.messages.put(("failed", "File not found: {}".format(str(e).split("'")[-2])))
+        except KeyError as e:
+            self.messages.put(("failed", 'Failed to find column: {}'.format(e)))
+        except Exception as e:
+            self.messages.put(("failed", "Check failed: {}".format(e)))
+
+
+def _sort_value(value):
+    # counts are ints unless the csv held something else, so keep ints and text apart when ordering
+    if isinstance(value, int):
+        return 0, value, ""
+    return 1, 0, value
+
+
+class ResultsView:
+    """
+    Filtered and sorted window onto the rows of a check, behind the GUI's results table.
+    The rows are never copied or rebuilt: the view keeps the positions of the rows passing the filter in the
+    current sort order, and only the page of rows on screen is formatted.
+    status is MATCH, ERROR or None, tape an LTO_TAPE value or None and error one of the engine's error flags or None
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.tapes = set()
+        self.status = None
+        self.tape = None
+        self.error = None
+        self.sort_column = None
+        self.sort_reverse = False
+        self.visible = []
+        self._unsorted = False
+
+    def __len__(self):
+        return len(self.visible)
+
+    def _keep(self, row):
+        if self.status is not None and row.status != self.status:
+            return False
+        if self.tape is not None and (row.lto is None or row.lto.media != self.tape):
+            return False
+        if self.error is not None and not row.errors & self.error:
+            return False
+        return True
+
+    def extend(self, rows):
+        """
+        Adds rows as they arrive from a running check. They are shown after the rows already sorted
+        until the next resort
+        """
+        position = len(self.rows)
+        self.rows.extend(rows)
+        for row in rows:
+            if row.lto is not None:
+                self.tapes.add(row.lto.media)
+            if self._keep(row):
+                self.visible.append(position)
+            position += 1
+        if self.sort_column is not None:
+            self._unsorted = True
+
+    def set_filter(self, status=None, tape=None, error=None):
+        self.status = status
+        self.tape = tape
+        self.error = error
+        rows = self.rows
+        keep = self._keep
+        self.visible = [position for position in range(len(rows)) if keep(rows[position])]
+        self._unsorted = self.sort_column is not None
+        self.resort()
+
+    def sort(self, column, reverse=False):
+        """
+        Orders the rows by a FIELDNAMES column, or back to report order when column is None
+        """
+        self.sort_column = column
+        self.sort_reverse = reverse
+        self._unsorted = True
+        self.resort()
+
+    def resort(self):
+        if not self._unsorted:
+            return
+        self._unsorted = False
+        if self.sort_column is None:
+            self.visible.sort()
+            return
+        value = COLUMN_VALUES[FIELDNAMES.index(self.sort_column)]
+        rows = self.rows
+        self.visible.sort(key=lambda position: _sort_value(value(rows[position])), reverse=self.sort_reverse)
+
+    def page(self, first, count):
+        """
+        Returns the report lines of count visible rows starting at first
+        """
+        rows = self.rows
+        return [report_line(rows[position]) for position in self.visible[first:first + count]]
+
+
 if __name__ == "__main__":      # executed when run from the command line
-    check()
+    check(*sys.argv[1:3])
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+"""
+Persistent checksum cache for restore verification.
+Digests are stored in SQLite keyed by file path and are only reused while the file's size, mtime and inode
+are unchanged, so repeated verifications of the same restore skip re-reading files that have not changed.
+"""
+
+# Import from Python Standard Library
+import os
+import time
+import sqlite3
+import threading
+
+# Import from the package
+from ltocheck_defaults import DEFAULT_HASH_CACHE, DEFAULT_HASH_CACHE_MAX_ENTRIES, DEFAULT_HASH_CACHE_MAX_AGE_DAYS
+
+
+COMMIT_EVERY = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    md5 BLOB NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS hashes_used_at ON hashes (used_at);
+"""
+
+
+class HashCache:
+    """
+    Thread safe checksum cache. Writes are committed every COMMIT_EVERY changes and on close, and the database
+    runs in WAL mode, so a crash loses at most the last uncommitted digests and never corrupts the cache.
+    Entries unused for max_age_days, or beyond the max_entries most recently used, are evicted on close
+    """
+
+    def __init__(self, cache_path=DEFAULT_HASH_CACHE, max_entries=DEFAULT_HASH_CACHE_MAX_ENTRIES,
+                 max_age_days=DEFAULT_HASH_CACHE_MAX_AGE_DAYS):
+        directory = os.path.dirname(cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self._changes = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(cache_path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get(self, path, stat):
+        """
+        Returns the cached digest for a file, or None when it is unknown or has changed since it was hashed
+        """
+        with self._lock:
+            entry = self._connection.execute("SELECT size, mtime_ns, inode, md5 FROM hashes WHERE path = ?",
+                                             (path,)).fetchone()
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[:3] != (stat.st_size, stat.st_mtime_ns, stat.st_ino):
+                self._connection.execute("DELETE FROM hashes WHERE path = ?", (path,))
+                self.invalidated += 1
+                self.misses += 1
+                self._changed()
+                return None
+            self._connection.execute("UPDATE hashes SET used_at = ? WHERE path = ?", (time.time(), path))
+            self.hits += 1
+            self._changed()
+            return entry[3]
+
+    def put(self, path, stat, md5):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO hashes (path, size, mtime_ns, inode, md5, used_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, stat.st_ino, md5, time.time()))
+            self._changed()
+
+    def _changed(self):
+        self._changes += 1
+        if self._changes >= COMMIT_EVERY:
+            self._connection.commit()
+            self._changes = 0
+
+    def evict(self):
+        """
+        Drops entries older than max_age_days and the least recently used entries beyond max_entries
+        """
+        with self._lock:
+            if self.max_age_days is not None:
+                self._connection.execute("DELETE FROM hashes WHERE used_at < ?",
+                                         (time.time() - self.max_age_days * 86400,))
+            if self.max_entries is not None:
+                self._connection.execute(
+                    "DELETE FROM hashes WHERE path IN "
+                    "(SELECT path FROM hashes ORDER BY used_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+            self._connection.commit()
+
+    def close(self):
+        if self._connection is None:
+            return
+        self.evict()
+        self._connection.close()
+        self._connection = None
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+
+"""
+Incremental re-check against a previous report.
+Both csvs are read as usual (the master from its snapshot when unchanged), then the master clips whose own
+frames, size or MD5 changed, that are new, or that an LTO row with changed frames, size, MD5 or tape can match are
+found from the previous report. Only those clips are looked up and compared again; every other clip takes its
+status and errors from the previous report. A delta report holds the re-evaluated rows and the full report merges
+them with the reused ones, identical to the report of a full check.
+Both csvs and the previous report are still parsed, so this only saves time when matching is the costly part of a
+check (prefix and contains matching of large csvs); with exact matching it costs about as much as a full check.
+"""
+
+# Import from Python Standard Library
+import os
+import collections
+
+# Import from the package
+from ltocheck_csvfile import column_indices, open_csv
+from ltocheck_engine import CheckResult, LTOSource, RowResult, ERROR_MESSAGES, MATCH, NOT_FOUND, compare_records, \
+    load_lto, load_master, log_nothing
+from ltocheck_index import NameIndex
+from ltocheck_records import parse_count, parse_md5, parse_media
+
+# changed clips are matched by scanning the LTO records up to this many clips, beyond it an index is built
+SCAN_LIMIT = 16
+
+_PREVIOUS_FIELDS = ("FILENAME", "FRAMES_MASTER", "SIZE_MASTER", "MD5_MASTER", "FRAMES_LTO", "SIZE_LTO", "MD5_LTO",
+                    "LTO_TAPE", "STATUS", "ERROR MESSAGES")
+
+
+def delta_name(out_name):
+    """
+    Returns the file name of the delta report written next to the full report out_name
+    """
+    position = out_name.lower().rfind(".csv")
+    if position < 0:
+        position = len(os.path.splitext(out_name)[0])
+    return out_name[:position] + "_delta" + out_name[position:]
+
+
+def _previous_errors(status, messages):
+    if status == MATCH:
+        return 0
+    return sum(flag for flag, message in ERROR_MESSAGES if message.strip() in messages)
+
+
+def read_previous(path):
+    """
+    Reads a report into {clip name: [(master values, LTO values or None when not found, error bitmask), ...]},
+    in report order. Values are the frames, size and MD5 and for the LTO also the tape, normalized as the records
+    hold them. Returns the clips and the number of rows read
+    """
+    previous = collections.defaultdict(list)
+    count = 0
+    with open_csv(path) as reader:
+        header = next(reader, None)
+        if header is None:
+            return previous, 0
+        indices = column_indices(header, _PREVIOUS_FIELDS)
+        for row in reader:
+            if not row:
+                continue
+            count += 1
+            row += [""] * (len(header) - len(row))
+            name, frames, size, md5, lto_frames, lto_size, lto_md5, tape, status, messages = (row[i] for i in indices)
+            lto = None if lto_frames == "" and lto_size == "" and lto_md5 == "" and tape == "" \
+                else (parse_count(lto_frames), parse_count(lto_size), parse_md5(lto_md5), parse_media(tape))
+            previous[name].append(((parse_count(frames), parse_count(size), parse_md5(md5)), lto,
+                                   _previous_errors(status, messages)))
+    return previous, count
+
+
+class _NameMatcher:
+    """
+    Finds the master clip names an LTO name matches in a match mode, from the set of master names.
+    Only the prefixes (prefix mode) or substrings (contains mode) with the length of a master name are tried
+    """
+
+    def __init__(self, master_names, match_mode):
+        self.names = master_names
+        self.match_mode = match_mode
+        self.lengths = sorted({len(name) for name in master_names})
+
+    def __call__(self, lto_name):
+        if self.match_mode == "exact":
+            return [lto_name] if lto_name in self.names else []
+        found = []
+        for length in self.lengths:
+            if length > len(lto_name):
+                break
+            starts = range(1) if self.match_mode == "prefix" else range(len(lto_name) - length + 1)
+            for start in starts:
+                candidate = lto_name[start:start + length]
+                if candidate in self.names:
+                    found.append(candidate)
+        return found
+
+
+def changed_clips(master_records, lto_records, previous, match_mode):
+    """
+    Returns the names of the master clips to compare again and the LTO records by their values.
+    A clip is compared again when it is new, listed more than once on the master, its master values differ from
+    the previous report, or the LTO rows it matches with some values are not the ones the previous report lists
+    for it: LTO rows with new or changed values, and rows gone from the LTO csv.
+    The LTO records by values are (position, record) pairs in LTO order
+    """
+    names = collections.Counter(master.name for master in master_records)
+    changed = set()
+    for master in master_records:
+        rows = previous.get(master.name)
+        if rows is None or names[master.name] > 1:
+            changed.add(master.name)
+            continue
+        values = (master.frames, master.size, master.md5)
+        if any(master_values != values for master_values, _, _ in rows):
+            changed.add(master.name)
+
+    lto_by_values = collections.defaultdict(list)
+    for position, lto in enumerate(lto_records):
+        lto_by_values[(lto.frames, lto.size, lto.md5, lto.media)].append((position, lto))
+    # the clips each LTO values were listed under, once per row
+    listed = {}
+    for name, rows in previous.items():
+        for _, values, _ in rows:
+            if values is not None:
+                listed.setdefault(values, []).append(name)
+    matcher = _NameMatcher(set(names), match_mode)
+    for values, ltos in lto_by_values.items():
+        now = [name for _, lto in ltos for name in matcher(lto.name)]
+        before = listed.pop(values, [])
+        if now == before:
+            continue
+        now = collections.Counter(now)
+        before = collections.Counter(before)
+        changed.update(name for name in set(now) | set(before) if now[name] != before[name])
+    for before in listed.values():
+        changed.update(before)
+    return changed, lto_by_values
+
+
+def _scanner(lto_records, match_mode):
+    """
+    Returns a lookup scanning every LTO record, returning them in LTO order as NameIndex lookups do
+    """
+    if match_mode == "exact":
+        return lambda name: [lto for lto in lto_records if lto.name == name]
+    if match_mode == "prefix":
+        return lambda name: [lto for lto in lto_records if lto.name.startswith(name)]
+    return lambda name: [lto for lto in lto_records if name in lto.name]
+
+
+def _matches(name, lto_name, match_mode):
+    if match_mode == "exact":
+        return lto_name == name
+    if match_mode == "prefix":
+        return lto_name.startswith(name)
+    return name in lto_name
+
+
+def _reused_rows(master, rows, lto_by_values, match_mode):
+    """
+    Returns the RowResults of an unchanged clip: the current LTO records it matches with the values its previous
+    report rows list, in LTO order, with the errors those rows list. Neither the clip's nor these LTO records'
+    values changed, so comparing them again would give the same errors
+    """
+    if rows[0][1] is None:
+        return [RowResult(master, None, NOT_FOUND)]
+    if len(rows) == 1:
+        pairs = lto_by_values[rows[0][1]]
+        if len(pairs) == 1:     # the only record with these values is the one the clip matches
+            return [RowResult(master, pairs[0][1], rows[0][2])]
+    errors = {values: row_errors for _, values, row_errors in rows}
+    found = []
+    for values in errors:
+        found.extend(pair for pair in lto_by_values[values] if _matches(master.name, pair[1].name, match_mode))
+    found.sort(key=lambda pair: pair[0])
+    return [RowResult(master, lto, errors[lto.frames, lto.size, lto.md5, lto.media]) for _, lto in found]
+
+
+def check_since(master_path, lto_path, previous_path, match_mode="exact", on_row=None, on_changed=None,
+                keep_rows=True, log=None, snapshots=None):
+    """
+    Checks a master csv against an LTO csv, only comparing the clips changed since the previous report at
+    previous_path, and returns the CheckResult of the full check.
+    on_row is called with every RowResult in report order, and on_changed with the RowResults of the clips
+    compared again. snapshots is an optional SnapshotCache for the parsed master csv
+    """
+    log = log or log_nothing
+    result = CheckResult(keep_rows=keep_rows)
+    master_records = load_master(result, master_path, log, snapshots=snapshots)
+    lto_records = load_lto(result, lto_path, log)
+    source = LTOSource(lto_path, result.lto_raw_count, result.lto_count)
+    result.sources.append(source)
+
+    log("Attempting previous report read")
+    with result.metrics.phase("read previous report") as phase:
+        previous, count = read_previous(previous_path)
+        phase.rows = count
+    log("Previous report read from path {}\n{} rows, {} clips".format(previous_path, count, len(previous)))
+
+    with result.metrics.phase("find changes") as phase:
+        changed, lto_by_values = changed_clips(master_records, lto_records, previous, match_mode)
+        changed_count = sum(1 for master in master_records if master.name in changed)
+        phase.rows = result.master_count + result.lto_count
+    log("{} of {} master clips changed since the previous report".format(changed_count, result.master_count))
+
+    with result.metrics.phase("index") as phase:
+        if changed_count <= SCAN_LIMIT:
+            lookup = _scanner(lto_records, match_mode)
+        else:
+            index = NameIndex(lto_records)
+            index.prepare(match_mode)
+            lookup = index.matcher(match_mode)
+            phase.rows = result.lto_count
+
+    with result.metrics.phase("compare", streams=True) as phase:
+        for master in master_records:
+            if master.name in changed:
+                rows = [RowResult(master, lto, compare_records(master, lto)) for lto in lookup(master.name)] \
+                    or [RowResult(master, None, NOT_FOUND)]
+                if on_changed is not None:
+                    for row in rows:
+                        on_changed(row)
+            else:
+                rows = _reused_rows(master, previous[master.name], lto_by_values, match_mode)
+            for row in rows:
+                result.add(row, source)
+                if on_row is not None:
+                    on_row(row)
+        phase.rows = result.master_count
+    return result
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+"""
+Name index over the filtered LTO rows, used to join master rows to LTO rows.
+The index is built once per check so each master lookup avoids a scan of the whole LTO list.
+"""
+
+# Import from Python Standard Library
+import array
+import bisect
+import collections
+
+# Import from the package
+
+
+MATCH_MODES = ("exact", "prefix", "contains")
+
+# clip names share most of their trigrams (dates, camera and reel letters), so 4 character grams give far shorter
+# posting lists for a few more distinct grams
+GRAM_LENGTH = 4
+
+
+def name_grams(name):
+    """
+    Returns the distinct grams of a clip name, none for names shorter than a gram
+    """
+    return {name[i:i + GRAM_LENGTH] for i in range(len(name) - GRAM_LENGTH + 1)}
+
+
+class NameIndex:
+    """
+    Maps clip names to the positions of the LTO rows carrying them.
+    Lookups return rows in LTO list order, so a master clip found on several tapes
+    reports every tape in the same order as a full scan would.
+    The prefix and contains structures are only built the first time they are used.
+    """
+
+    def __init__(self, lto_rows):
+        self.rows = lto_rows
+        self.positions = collections.defaultdict(list)
+        for position, lto_row in enumerate(lto_rows):
+            self.positions[lto_row.name].append(position)
+        self._sorted_names = None
+        self._grams = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def matcher(self, match_mode):
+        """
+        Returns the lookup function for the given match mode
+        """
+        if match_mode not in MATCH_MODES:
+            raise ValueError("Unknown match mode: {}".format(match_mode))
+        return getattr(self, match_mode)
+
+    def prepare(self, match_mode):
+        """
+        Builds the structures a match mode uses ahead of the first lookup, so their cost can be timed on its own
+        """
+        if match_mode == "prefix" and self._sorted_names is None:
+            self._sorted_names = sorted(self.positions)
+        elif match_mode == "contains" and self._grams is None:
+            self._build_grams()
+
+    def exact(self, name):
+        """
+        Returns every LTO row whose name equals the given name
+        """
+        return [self.rows[position] for position in self.positions.get(name, ())]
+
+    def prefix(self, name):
+        """
+        Returns every LTO row whose name starts with the given name
+        """
+        if self._sorted_names is None:
+            self._sorted_names = sorted(self.positions)
+        names = self._sorted_names
+        found = []
+        i = bisect.bisect_left(names, name)
+        while i < len(names) and names[i].startswith(name):
+            found.append(names[i])
+            i += 1
+        return self._rows_for(found)
+
+    def contains(self, name):
+        """
+        Returns every LTO row whose name contains the given name.
+        Candidates are the names carrying both of the two rarest grams of the name and are then confirmed with a
+        substring test; names shorter than a gram fall back to a scan of the distinct LTO names.
+        """
+        if self._grams is None:
+            self._build_grams()
+        names = self._gram_names
+        if len(name) < GRAM_LENGTH:
+            return self._rows_for([lto_name for lto_name in names if name in lto_name])
+        grams = self._grams
+        rarest = second = None
+        for i in range(len(name) - GRAM_LENGTH + 1):
+            posting = grams.get(name[i:i + GRAM_LENGTH])
+            if posting is None:
+                return []
+            if rarest is None or len(posting) < len(rarest):
+                rarest, second = posting, rarest
+            elif posting is not rarest and (second is None or len(posting) < len(second)):
+                second = posting
+        candidates = rarest if second is None else set(rarest).intersection(second)
+        return self._rows_for([names[name_id] for name_id in candidates if name in names[name_id]])
+
+    def _build_grams(self):
+        self._gram_names = list(self.positions)
+        self._grams = {}
+        for name_id, lto_name in enumerate(self._gram_names):
+            for gram in name_grams(lto_name):
+                posting = self._grams.get(gram)
+                if posting is None:
+                    posting = self._grams[gram] = array.array('L')
+                posting.append(name_id)
+
+    def _rows_for(self, names):
+        if len(names) == 1:
+            return [self.rows[position] for position in self.positions[names[0]]]
+        positions = sorted(position for name in names for position in self.positions[name])
+        return [self.rows[position] for position in positions]
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+"""
+Streaming ingestion of master and LTO csv exports.
+Only the needed columns are picked out of each row, rows are filtered while reading and the surviving video rows
+are kept as compact records.
+"""
+
+# Import from Python Standard Library
+import zlib
+import operator
+
+# Import from the package
+from ltocheck_csvfile import CsvChunk, column_indices, open_chunk, open_csv
+from ltocheck_records import MasterRecord, LTORecord, parse_count, parse_md5, parse_media
+
+
+PROGRESS_ROWS = 5000
+
+# the columns read from each csv, in the order of the value tuples passed to the filters and record makers
+MASTER_FIELDS = ("Name", "Frames", "File Size", "MD5")
+LTO_FIELDS = ("Name", "Frames", "Size", "MD5", "Media", "Path")
+_NAME, _FRAMES, _SIZE, _MD5, _MEDIA, _PATH = range(6)
+
+
+def _is_master_video(values):
+    return values[_FRAMES] != "" and values[_FRAMES] != "1"
+
+
+def _is_lto_video(values):
+    return "CAMERA_MASTER" in values[_PATH] and values[_FRAMES] != "" and values[_FRAMES] != "1"
+
+
+def shard_of(name, shards):
+    """
+    Returns the shard a clip name belongs to; stable across processes, unlike hash()
+    """
+    return zlib.crc32(name.encode('utf-8', 'surrogatepass')) % shards
+
+
+def _master_record(values):
+    return MasterRecord(values[_NAME].split('.')[0],
+                        parse_count(values[_FRAMES]),
+                        parse_count(values[_SIZE]),
+                        parse_md5(values[_MD5]))
+
+
+def _lto_record(values):
+    return LTORecord(values[_NAME].split('.')[0],
+                     parse_count(values[_FRAMES]),
+                     parse_count(values[_SIZE]),
+                     parse_md5(values[_MD5]),
+                     parse_media(values[_MEDIA]))
+
+
+def _master_values(values):
+    return (values[_NAME].split('.')[0], parse_count(values[_FRAMES]), parse_count(values[_SIZE]),
+            parse_md5(values[_MD5]))
+
+
+def _lto_values(values):
+    return (values[_NAME].split('.')[0], parse_count(values[_FRAMES]), parse_count(values[_SIZE]),
+            parse_md5(values[_MD5]), parse_media(values[_MEDIA]))
+
+
+class CsvScan:
+    """
+    Iterates over a csv, yielding (record, full file name) for each video row in file order.
+    input_file is a csv path, or a CsvChunk to read only the rows of one byte range of a csv.
+    fields are the canonical names of the columns read, passed to is_video and make_record as a tuple of values.
+    raw_count holds the number of rows read so far
+    """
+
+    def __init__(self, input_file, make_record, is_video, fields):
+        self.input_file = input_file
+        self.make_record = make_record
+        self.is_video = is_video
+        self.fields = fields
+        self.raw_count = 0
+
+    def __iter__(self):
+        is_video = self.is_video
+        make_record = self.make_record
+        chunk = self.input_file if isinstance(self.input_file, CsvChunk) else None
+        with open_csv(self.input_file) if chunk is None else open_chunk(chunk) as reader:
+            header = next(reader, None) if chunk is None else chunk.header
+            if header is None:
+                return
+            indices = column_indices(header, self.fields)
+            pick = operator.itemgetter(*indices)
+            width = max(indices) + 1
+            padding = [""] * width
+            for row in reader:
+                if not row:     # blank lines are skipped, as csv.DictReader does
+                    continue
+                self.raw_count += 1
+                if len(row) < width:
+                    row = (row + padding)[:width]
+                values = pick(row)
+                if not is_video(values):
+                    continue
+                yield make_record(values), values[_NAME]
+
+
+def scan_master(input_file):
+    return CsvScan(input_file, _master_record, _is_master_video, MASTER_FIELDS)
+
+
+def scan_lto(input_file):
+    return CsvScan(input_file, _lto_record, _is_lto_video, LTO_FIELDS)
+
+
+def scan_values(input_file, kind):
+    """
+    Returns a scan of a master or LTO csv yielding the plain tuple of each record's values instead of the record,
+    cheaper to send between processes; MasterRecord(*values) or LTORecord(*values) makes the record
+    """
+    if kind == "master":
+        return CsvScan(input_file, _master_values, _is_master_video, MASTER_FIELDS)
+    return CsvScan(input_file, _lto_values, _is_lto_video, LTO_FIELDS)
+
+
+def collect(scan, progress=None):
+    """
+    Reads a whole scan into (clip name, full file name, record) tuples in file order.
+    progress, when given, is called with the number of rows read so far every PROGRESS_ROWS video rows
+    """
+    if progress is None:
+        return [(record.name, raw_name, record) for record, raw_name in scan]
+    keyed = []
+    progress(0)
+    for record, raw_name in scan:
+        keyed.append((record.name, raw_name, record))
+        if len(keyed) % PROGRESS_ROWS == 0:
+            progress(scan.raw_count)
+    progress(scan.raw_count)
+    return keyed
+
+
+def sort_collected(keyed):
+    """
+    Returns the records collected from a scan sorted by clip name then full file name
+    """
+    keyed.sort(key=operator.itemgetter(0, 1))
+    return [record for _, _, record in keyed]
+
+
+def _ingest(scan, progress=None):
+    """
+    Reads a whole scan, sorted by clip name then full file name.
+    Returns the records and the number of rows read
+    """
+    return sort_collected(collect(scan, progress)), scan.raw_count
+
+
+def read_master(input_file, progress=None):
+    """
+    Reads the video rows of a master (Silverstack) csv, returns the records and the raw row count
+    """
+    return _ingest(scan_master(input_file), progress)
+
+
+def read_lto(input_file, progress=None):
+    """
+    Reads the camera master video rows of an LTO csv, returns the records and the raw row count
+    """
+    return _ingest(scan_lto(input_file), progress)
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+"""
+Run instrumentation.
+Each phase of a check records its wall time, the rows it handled and the peak resident memory reached by its end,
+for the timing table printed with the summary and the --metrics-json export. --profile wraps the whole run
+in cProfile.
+The JSON and profiling modules are only imported when those options are used.
+"""
+
+# Import from Python Standard Library
+import sys
+import time
+import contextlib
+
+try:
+    import resource
+except ImportError:     # not available on Windows
+    resource = None
+
+# Import from the package
+
+
+PROFILE_LINES = 25
+
+
+def peak_rss():
+    """
+    Returns the peak resident set size in bytes of this process or of its largest finished worker process,
+    or None where the platform does not report it
+    """
+    if resource is None:
+        return None
+    scale = 1 if sys.platform == "darwin" else 1024     # ru_maxrss is in bytes on macOS, kilobytes elsewhere
+    return scale * max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                       resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+class Phase:
+    """
+    Wall time, rows handled and peak RSS of one phase of a run
+    """
+    __slots__ = ('name', 'seconds', 'rows', 'peak_rss')
+
+    def __init__(self, name, seconds=0.0, rows=None, peak_rss=None):
+        self.name = name
+        self.seconds = seconds
+        self.rows = rows
+        self.peak_rss = peak_rss
+
+    @property
+    def rows_per_second(self):
+        if self.rows is None or not self.seconds:
+            return None
+        return self.rows / self.seconds
+
+    def as_dict(self):
+        return {"name": self.name, "seconds": self.seconds, "rows": self.rows,
+                "rows per second": self.rows_per_second, "peak rss": self.peak_rss}
+
+
+class Metrics:
+    """
+    The phases of a run in the order they finished. timings maps each phase name to its seconds.
+    The phase that streams results to on_row is remembered so time spent writing the report from inside it
+    can be split out as a phase of its own
+    """
+
+    def __init__(self):
+        self.phases = []
+        self.timings = {}
+        self._stream_phase = None
+
+    @contextlib.contextmanager
+    def phase(self, name, streams=False):
+        """
+        Times the enclosed block as a phase. Set rows on the yielded Phase to record the rows it handled
+        """
+        phase = Phase(name)
+        started = time.perf_counter()
+        try:
+            yield phase
+        finally:
+            phase.seconds = time.perf_counter() - started
+            phase.peak_rss = peak_rss()
+            self._add(phase)
+            if streams:
+                self._stream_phase = phase
+
+    def _add(self, phase):
+        self.phases.append(phase)
+        self.timings[phase.name] = phase.seconds
+
+    def split(self, name, seconds, rows=None, within=None):
+        """
+        Records the time spent writing the report as a phase of its own, taking the part of it spent inside
+        the streaming phase (within seconds, by default all of it) out of that phase
+        """
+        stream_phase = self._stream_phase
+        if stream_phase is not None:
+            stream_phase.seconds = max(0.0, stream_phase.seconds - (seconds if within is None else within))
+            self.timings[stream_phase.name] = stream_phase.seconds
+        self._add(Phase(name, seconds, rows, peak_rss()))
+
+    @property
+    def seconds(self):
+        return sum(phase.seconds for phase in self.phases)
+
+    def summary(self):
+        summary = "{: <24} {: >10} {: >12} {: >12} {: >12}".format("Phase", "Seconds", "Rows", "Rows/s",
+                                                                   "Peak RSS MB")
+        for phase in self.phases:
+            rate = phase.rows_per_second
+            summary += "\n{: <24} {: >10.3f} {: >12} {: >12} {: >12}".format(
+                phase.name, phase.seconds,
+                "" if phase.rows is None else phase.rows,
+                "" if rate is None else "{:.0f}".format(rate),
+                "" if phase.peak_rss is None else "{:.1f}".format(phase.peak_rss / 1e6))
+        summary += "\n{: <24} {: >10.3f}".format("Total", self.seconds)
+        return summary
+
+    def as_dict(self):
+        return {"seconds": self.seconds, "peak rss": peak_rss(), "phases": [phase.as_dict() for phase in self.phases]}
+
+
+def counts(result):
+    """
+    Returns the counts of a CheckResult as a dict, as exported to JSON
+    """
+    return {"master rows": result.master_raw_count, "master videos": result.master_count,
+            "lto rows": result.lto_raw_count, "lto videos": result.lto_count, "matches": result.matches,
+            "non-matches": result.non_matches, "not found": result.not_found}
+
+
+def write_json(path, result, command):
+    """
+    Writes the metrics and counts of a finished run as JSON
+    """
+    import json
+    import platform
+    metrics = result.metrics.as_dict()
+    metrics.update({"command": command, "argv": sys.argv[1:], "python": platform.python_version(),
+                    "platform": platform.platform(), "counts": counts(result)})
+    with open(path, 'w') as f:
+        json.dump(metrics, f, indent=2)
+
+
+@contextlib.contextmanager
+def profile(path):
+    """
+    Profiles the enclosed block with cProfile, saving the stats to path and printing the costliest calls
+    to stderr. Worker processes are not profiled
+    """
+    import pstats
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        stats = pstats.Stats(profiler, stream=sys.stderr)
+        stats.sort_stats("cumulative").print_stats(PROFILE_LINES)
+        print("Profile saved to {}".format(path), file=sys.stderr)
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+
+"""
+Multi-process checks.
+check_many verifies one master csv against several LTO csvs, ingesting and matching each LTO csv in a worker
+process against a master catalog that is parsed once and handed to every worker when it starts.
+check_sharded splits a single large check across the workers: they read byte ranges of both csvs, then match one
+hash partition of the clip names each.
+"""
+
+# Import from Python Standard Library
+import os
+import heapq
+import concurrent.futures
+
+# Import from the package
+from ltocheck_csvfile import split_csv
+from ltocheck_engine import CheckResult, LTOSource, RowResult, NOT_FOUND, compare_records, load_master, log_nothing
+from ltocheck_index import NameIndex
+from ltocheck_ingest import read_lto, scan_values, shard_of, sort_collected
+from ltocheck_records import MasterRecord, LTORecord
+
+
+_worker_master = None
+_worker_match_mode = None
+
+
+def _init_worker(master_records, match_mode):
+    global _worker_master, _worker_match_mode
+    _worker_master = master_records
+    _worker_match_mode = match_mode
+
+
+def _match_lto_file(lto_path):
+    """
+    Worker: reads one LTO csv and matches the shared master records against it.
+    Returns the raw and video row counts and a list of (master position, LTO record, error bitmask) hits
+    in master order
+    """
+    lto_records, raw_count = read_lto(lto_path)
+    lookup = NameIndex(lto_records).matcher(_worker_match_mode)
+    hits = []
+    for position, master in enumerate(_worker_master):
+        for lto in lookup(master.name):
+            hits.append((position, lto, compare_records(master, lto)))
+    return raw_count, len(lto_records), hits
+
+
+def check_many(master_path, lto_paths, match_mode="exact", jobs=None, on_row=None, keep_rows=True, log=None,
+               snapshots=None):
+    """
+    Checks a master csv against several LTO csvs and returns one merged CheckResult.
+    Each master record lists its hits from every LTO csv, in the order the csvs were given;
+    it is only reported as not found when no LTO csv carries it.
+    snapshots is an optional SnapshotCache for the parsed master csv
+    """
+    log = log or log_nothing
+    result = CheckResult(keep_rows=keep_rows)
+    master_records = load_master(result, master_path, log, snapshots=snapshots)
+
+    jobs = min(jobs or os.cpu_count() or 1, len(lto_paths))
+    log("Attempting to read and compare {} LTO csvs with {} workers".format(len(lto_paths), jobs))
+    with result.metrics.phase("read lto and compare") as phase:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                                    initargs=(master_records, match_mode)) as executor:
+            outcomes = list(executor.map(_match_lto_file, lto_paths))
+        phase.rows = sum(raw_count for raw_count, _, _ in outcomes)
+
+    all_hits = []
+    for lto_path, (raw_count, count, hits) in zip(lto_paths, outcomes):
+        log("LTO csv read from path {}\n{} files found, {} video files filtered".format(lto_path, raw_count, count))
+        result.sources.append(LTOSource(lto_path, raw_count, count))
+        result.lto_raw_count += raw_count
+        result.lto_count += count
+        all_hits.append(hits)
+
+    log("Merging results")
+    with result.metrics.phase("merge", streams=True) as phase:
+        cursors = [0] * len(all_hits)
+        for position, master in enumerate(master_records):
+            found = False
+            for i, hits in enumerate(all_hits):
+                cursor = cursors[i]
+                while cursor < len(hits) and hits[cursor][0] == position:
+                    found = True
+                    row = RowResult(master, hits[cursor][1], hits[cursor][2])
+                    result.add(row, result.sources[i])
+                    if on_row is not None:
+                        on_row(row)
+                    cursor += 1
+                cursors[i] = cursor
+            if not found:
+                row = RowResult(master, None, NOT_FOUND)
+                result.add(row)
+                if on_row is not None:
+                    on_row(row)
+        phase.rows = result.master_count
+    return result
+
+
+def _read_part(part, kind):
+    """
+    Worker: reads the video rows of one byte range of a csv, or of a whole csv that could not be split.
+    Returns the raw row count and (clip name, full file name, record values) tuples in file order
+    """
+    scan = scan_values(part, kind)
+    keyed = [(values[0], raw_name, values) for values, raw_name in scan]
+    return scan.raw_count, keyed
+
+
+def _submit_reads(executor, path, kind, jobs):
+    parts = split_csv(path, jobs)
+    return [executor.submit(_read_part, part, kind) for part in (parts if parts is not None else [path])]
+
+
+def _gather_reads(futures):
+    """
+    Returns the total raw row count of the parts of a csv and their record values sorted by clip name then full
+    file name, as a single reader would sort them
+    """
+    raw_count = 0
+    keyed = []
+    for future in futures:
+        part_raw_count, part_keyed = future.result()
+        raw_count += part_raw_count
+        keyed.extend(part_keyed)
+    return raw_count, sort_collected(keyed)
+
+
+def _partition(values, shards):
+    """
+    Returns the (position, record values) pairs of each shard of clip names, in their sorted order
+    """
+    partitions = [[] for _ in range(shards)]
+    for position, record_values in enumerate(values):
+        partitions[shard_of(record_values[0], shards)].append((position, record_values))
+    return partitions
+
+
+def _match_shard(match_mode, master_entries, lto_entries):
+    """
+    Worker: matches the master records of one shard against the LTO records they can match.
+    Entries are (position, record values) pairs in sorted order.
+    Returns (master position, LTO position, error bitmask) tuples in master order, each master's in LTO order
+    """
+    lto_records = [LTORecord(*record_values) for _, record_values in lto_entries]
+    # the lookups return records, mapped back to their position in the whole LTO csv
+    positions = {id(lto): position for lto, (position, _) in zip(lto_records, lto_entries)}
+    lookup = NameIndex(lto_records).matcher(match_mode)
+    hits = []
+    for position, record_values in master_entries:
+        master = MasterRecord(*record_values)
+        for lto in lookup(master.name):
+            hits.append((position, positions[id(lto)], compare_records(master, lto)))
+    return hits
+
+
+def check_sharded(master_path, lto_path, match_mode="exact", jobs=2, on_row=None, keep_rows=True, log=None):
+    """
+    Checks a master csv against one LTO csv using jobs worker processes.
+    Each csv is split into byte ranges of whole rows read by the workers in parallel. The sorted records are then
+    partitioned by a hash of the clip name, each worker matches one shard and returns compact (master position,
+    LTO position, error bitmask) hits, and the shards are merged back into master order as they are written out.
+    Exact matching partitions both csvs; prefix and contains matches can cross shards, so in those modes every
+    worker gets the whole LTO csv
+    """
+    log = log or log_nothing
+    result = CheckResult(keep_rows=keep_rows)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        log("Attempting to read the csvs in {} parts each".format(jobs))
+        with result.metrics.phase("read") as phase:
+            master_reads = _submit_reads(executor, master_path, "master", jobs)
+            lto_reads = _submit_reads(executor, lto_path, "lto", jobs)
+            result.master_raw_count, master_values = _gather_reads(master_reads)
+            result.lto_raw_count, lto_values = _gather_reads(lto_reads)
+            phase.rows = result.master_raw_count + result.lto_raw_count
+        result.master_count = len(master_values)
+        result.lto_count = len(lto_values)
+        log("Master csv read from path {}\n{} files found, {} video files filtered"
+            .format(master_path, result.master_raw_count, result.master_count))
+        log("LTO csv read from path {}\n{} files found, {} video files filtered"
+            .format(lto_path, result.lto_raw_count, result.lto_count))
+
+        log("Attempting to compare the csvs in {} shards".format(jobs))
+        with result.metrics.phase("compare") as phase:
+            master_shards = _partition(master_values, jobs)
+            lto_shards = _partition(lto_values, jobs) if match_mode == "exact" \
+                else [list(enumerate(lto_values))] * jobs
+            futures = [executor.submit(_match_shard, match_mode, master_entries, lto_entries)
+                       for master_entries, lto_entries in zip(master_shards, lto_shards)]
+            del master_shards, lto_shards
+            # the records the report is written from are made while the workers match
+            master_records = [MasterRecord(*record_values) for record_values in master_values]
+            lto_records = [LTORecord(*record_values) for record_values in lto_values]
+            del master_values, lto_values
+            shard_hits = [future.result() for future in futures]
+            phase.rows = result.master_count
+    source = LTOSource(lto_path, result.lto_raw_count, result.lto_count)
+    result.sources.append(source)
+
+    log("Merging shards")
+    with result.metrics.phase("merge", streams=True) as phase:
+        hits = heapq.merge(*shard_hits)
+        hit = next(hits, None)
+        for position, master in enumerate(master_records):
+            if hit is None or hit[0] != position:
+                rows = [RowResult(master, None, NOT_FOUND)]
+            else:
+                rows = []
+                while hit is not None and hit[0] == position:
+                    rows.append(RowResult(master, lto_records[hit[1]], hit[2]))
+                    hit = next(hits, None)
+            for row in rows:
+                result.add(row, source)
+                if on_row is not None:
+                    on_row(row)
+        phase.rows = result.master_count
+    return result
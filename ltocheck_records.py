@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+"""
+Compact records for the filtered master and LTO rows.
+Values are normalized once at ingest: frame counts and sizes become ints, MD5 hashes become 16 byte digests
+and tape labels are interned, so comparing two records is a few int and bytes equality checks.
+"""
+
+# Import from Python Standard Library
+import sys
+import binascii
+
+# Import from the package
+
+
+class MasterRecord:
+    """
+    One video file listed in the master csv
+    """
+    __slots__ = ('name', 'frames', 'size', 'md5')
+
+    def __init__(self, name, frames, size, md5):
+        self.name = name
+        self.frames = frames
+        self.size = size
+        self.md5 = md5
+
+    def __repr__(self):
+        return "{}({!r}, {!r}, {!r}, {!r})".format(type(self).__name__, self.name, self.frames, self.size,
+                                                   format_md5(self.md5))
+
+
+class LTORecord(MasterRecord):
+    """
+    One video file listed in an LTO csv, with the tape it was written to
+    """
+    __slots__ = ('media',)
+
+    def __init__(self, name, frames, size, md5, media):
+        MasterRecord.__init__(self, name, frames, size, md5)
+        self.media = media
+
+    def __repr__(self):
+        return "{}({!r}, {!r}, {!r}, {!r}, {!r})".format(type(self).__name__, self.name, self.frames, self.size,
+                                                         format_md5(self.md5), self.media)
+
+
+def parse_count(value):
+    """
+    Returns a frame count or byte size as an int, or the stripped text when it is not a plain number
+    """
+    value = value.strip()
+    if value.isdecimal():
+        return int(value)
+    return value
+
+
+def parse_md5(value):
+    """
+    Returns an MD5 hex string as a 16 byte digest, or the stripped text when it is not a valid hash
+    """
+    value = value.strip()
+    if len(value) == 32:
+        try:
+            return binascii.unhexlify(value)
+        except (binascii.Error, ValueError):
+            pass
+    return value
+
+
+def parse_media(value):
+    return sys.intern(value)
+
+
+def format_md5(md5):
+    """
+    Returns a digest as a lowercase hex string, leaving unparsed text untouched
+    """
+    if isinstance(md5, bytes):
+        return md5.hex()
+    return md5
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+"""
+CSV report writer shared by the CLI and GUI.
+Holds one handle open for the whole run and writes rows in blocks.
+"""
+
+# Import from Python Standard Library
+import csv
+import time
+
+# Import from the package
+from ltocheck_csvfile import open_output
+from ltocheck_records import format_md5
+
+
+FIELDNAMES = ["STATUS",
+              "FILENAME",
+              "FRAMES_MASTER",
+              "FRAMES_LTO",
+              "SIZE_MASTER",
+              "SIZE_LTO",
+              "MD5_MASTER",
+              "MD5_LTO",
+              "LTO_TAPE",
+              "ERROR MESSAGES"]
+
+BLOCK_ROWS = 10000
+
+
+def report_line(row):
+    """
+    Returns the report columns for one RowResult, in FIELDNAMES order
+    """
+    master = row.master
+    lto = row.lto
+    if lto is not None:
+        return [row.status,
+                master.name,
+                master.frames,
+                lto.frames,
+                master.size,
+                lto.size,
+                format_md5(master.md5),
+                format_md5(lto.md5),
+                lto.media,
+                row.error_message]
+    return [row.status,
+            master.name,
+            master.frames,
+            "",
+            master.size,
+            "",
+            format_md5(master.md5),
+            "",
+            "",
+            row.error_message]
+
+
+def _lto_value(name, format_value=None):
+    def value(row):
+        if row.lto is None:
+            return ""
+        lto_value = getattr(row.lto, name)
+        return lto_value if format_value is None else format_value(lto_value)
+    return value
+
+
+# the value of each report column for a RowResult, in FIELDNAMES order, to read one column without the whole line
+COLUMN_VALUES = (lambda row: row.status,
+                 lambda row: row.master.name,
+                 lambda row: row.master.frames,
+                 _lto_value('frames'),
+                 lambda row: row.master.size,
+                 _lto_value('size'),
+                 lambda row: format_md5(row.master.md5),
+                 _lto_value('md5', format_md5),
+                 _lto_value('media'),
+                 lambda row: row.error_message)
+
+
+class ReportWriter:
+    """
+    Writes the report header, then buffers result rows and flushes them every block_rows rows.
+    Accepts either a file path, which is opened and closed by the writer and compressed when it ends in .gz, .bz2,
+    .xz or .zst, or an already open text file.
+    The output is only opened on the first flush, so a check that fails before producing rows
+    leaves no empty report behind. Rows are formatted when they are flushed, and seconds holds the time spent
+    formatting and writing them.
+    """
+
+    def __init__(self, output, block_rows=BLOCK_ROWS):
+        self.output = output
+        self.block_rows = block_rows
+        self.rows_written = 0
+        self.seconds = 0.0
+        self.file = None
+        self.closed = False
+        self._owns_file = False
+        self._writer = None
+        self._pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None and self.file is None:
+            self.closed = True
+            return
+        self.close()
+
+    def _open(self):
+        if hasattr(self.output, 'write'):
+            self.file = self.output
+        else:
+            self.file = open_output(self.output)
+            self._owns_file = True
+        self._writer = csv.writer(self.file)
+        self._writer.writerow(FIELDNAMES)
+
+    def write(self, row):
+        """
+        Queues one RowResult for the report
+        """
+        self._pending.append(row)
+        if len(self._pending) >= self.block_rows:
+            self.flush()
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        started = time.perf_counter()
+        if self.file is None:
+            self._open()
+        self._writer.writerows(map(report_line, self._pending))
+        self.rows_written += len(self._pending)
+        self._pending = []
+        self.file.flush()
+        self.seconds += time.perf_counter() - started
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        if self._owns_file:
+            self.file.close()
+        self.closed = True
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+"""
+Local HTTP/JSON front end of the check service.
+Answers GET /check, /summary, /clip and /cache with JSON, each request in its own thread, from one shared
+CheckService. Only imported by `ltocheck serve`, so http.server stays off the CLI's startup path.
+"""
+
+# Import from Python Standard Library
+import csv
+import json
+import http.server
+import socketserver
+import urllib.parse
+
+# Import from the package
+from ltocheck_csvfile import UnsupportedCompression
+from ltocheck_service import RequestError
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = urllib.parse.parse_qs(url.query)
+        try:
+            status, reply = 200, self.server.service.handle(url.path, params)
+        except RequestError as e:
+            status, reply = e.status, {"error": str(e)}
+        except FileNotFoundError as e:
+            status, reply = 404, {"error": "File not found: {}".format(e.filename)}
+        except KeyError as e:
+            status, reply = 422, {"error": "Failed to find column: {}".format(e)}
+        except (UnsupportedCompression, csv.Error, UnicodeDecodeError) as e:
+            status, reply = 422, {"error": str(e)}
+        except PermissionError as e:
+            status, reply = 403, {"error": "Permission denied: {}".format(e.filename)}
+        except OSError as e:
+            status, reply = 400, {"error": "Failed to read {}: {}".format(e.filename, e.strerror or e)}
+        except Exception as e:
+            self.server.service.log("{} {} failed: {!r}".format(self.address_string(), self.path, e))
+            status, reply = 500, {"error": "Internal error: {}".format(e)}
+        body = json.dumps(reply).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        self.server.service.log("{} {}".format(self.address_string(), format % args))
+
+
+class CheckServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """
+    HTTP server answering each request in its own thread from a shared CheckService:
+    GET /check, /summary and /clip with master, lto (repeated for several csvs), match_mode and, for /check,
+    rows=all|errors|none or for /clip, name; GET /cache returns the cache statistics
+    """
+    daemon_threads = True
+
+    def __init__(self, address, service):
+        http.server.HTTPServer.__init__(self, address, _Handler)
+        self.service = service
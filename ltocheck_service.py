@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+
+"""
+Check service shared by the requests of `ltocheck serve`.
+Several tools checking against the same large csvs share one process, which keeps the parsed master and LTO
+catalogs and their name indexes in a memory-bounded LRU cache. A cached catalog is reused until its csv's size or
+mtime changes, and concurrent requests for a csv that is not cached yet wait for one parse instead of each
+parsing it. Checks run through the same load and compare steps as the CLI check, so results are identical.
+"""
+
+# Import from Python Standard Library
+import os
+import sys
+import threading
+import collections
+
+# Import from the package
+from ltocheck_defaults import DEFAULT_SERVE_CACHE_MB
+from ltocheck_engine import CheckResult, LTOSource, RowResult, NOT_FOUND, compare_index, compare_records, \
+    load_lto, load_master, log_nothing
+from ltocheck_index import NameIndex, MATCH_MODES
+from ltocheck_metrics import counts
+from ltocheck_report import FIELDNAMES, report_line
+
+
+ROW_CHOICES = ("all", "errors", "none")
+
+# records are sampled to estimate a catalog's memory; the name index with its contains grams adds about
+# this much per record
+SAMPLE_RECORDS = 1000
+INDEX_BYTES = 320
+
+
+def _stamp(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def estimate_bytes(records):
+    """
+    Returns an estimate of the memory held by a catalog's records and name index, from a sample of the records
+    """
+    if not records:
+        return 0
+    step = max(1, len(records) // SAMPLE_RECORDS)
+    sample = records[::step]
+    sampled = 0
+    for record in sample:
+        sampled += sys.getsizeof(record) + sum(sys.getsizeof(getattr(record, slot))
+                                               for slot in ('name', 'frames', 'size', 'md5'))
+    return int(sampled / len(sample) * len(records)) + INDEX_BYTES * len(records)
+
+
+class Catalog:
+    """
+    The sorted records of one parsed csv, with the stamp (size, mtime) of the csv they were read from.
+    The name index is built the first time it is needed
+    """
+    __slots__ = ('kind', 'path', 'stamp', 'raw_count', 'records', 'nbytes', '_index', '_lock')
+
+    def __init__(self, kind, path, stamp, raw_count, records):
+        self.kind = kind
+        self.path = path
+        self.stamp = stamp
+        self.raw_count = raw_count
+        self.records = records
+        self.nbytes = estimate_bytes(records)
+        self._index = None
+        self._lock = threading.Lock()
+
+    def index(self, match_mode):
+        """
+        Returns the name index over the records, with the structures of match_mode built
+        """
+        with self._lock:
+            if self._index is None:
+                self._index = NameIndex(self.records)
+            self._index.prepare(match_mode)
+            return self._index
+
+
+class CatalogCache:
+    """
+    LRU cache of parsed csvs holding at most max_bytes of estimated memory; the catalog just loaded is always kept.
+    A catalog is parsed again once its csv changes. Loads of the same csv are serialized, so concurrent requests
+    parse it once. snapshots is an optional SnapshotCache the master csvs are loaded from and saved to
+    """
+
+    def __init__(self, max_bytes=DEFAULT_SERVE_CACHE_MB * 1024 * 1024, snapshots=None, log=None):
+        self.max_bytes = max_bytes
+        self.snapshots = snapshots
+        self.log = log or log_nothing
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._catalogs = collections.OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def get(self, kind, path, result):
+        """
+        Returns the Catalog of a "master" or "lto" csv, loading it when it is not cached or has changed since.
+        Loading phases are timed on result.
+        Raises FileNotFoundError when the csv does not exist
+        """
+        key = (kind, os.path.abspath(path))
+        with self._lock:
+            loading = self._loading.setdefault(key, threading.Lock())
+        with loading:
+            stamp = _stamp(path)
+            with self._lock:
+                catalog = self._catalogs.get(key)
+                if catalog is not None and catalog.stamp == stamp:
+                    self._catalogs.move_to_end(key)
+                    self.hits += 1
+                    return catalog
+                self.misses += 1
+            if kind == "master":
+                records = load_master(result, path, self.log, snapshots=self.snapshots)
+                catalog = Catalog(kind, path, stamp, result.master_raw_count, records)
+            else:
+                records = load_lto(result, path, self.log)
+                catalog = Catalog(kind, path, stamp, result.lto_raw_count, records)
+            with self._lock:
+                old = self._catalogs.pop(key, None)
+                if old is not None:
+                    self.nbytes -= old.nbytes
+                self._catalogs[key] = catalog
+                self.nbytes += catalog.nbytes
+                self._evict()
+            return catalog
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and len(self._catalogs) > 1:
+            _, catalog = self._catalogs.popitem(last=False)
+            self.nbytes -= catalog.nbytes
+            self.evictions += 1
+            self.log("Evicted {} csv {} from the cache".format(catalog.kind, catalog.path))
+
+    def stats(self):
+        with self._lock:
+            return {"max bytes": self.max_bytes, "bytes": self.nbytes, "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions,
+                    "catalogs": [{"kind": catalog.kind, "path": catalog.path, "videos": len(catalog.records),
+                                  "bytes": catalog.nbytes} for catalog in self._catalogs.values()]}
+
+
+class RequestError(Exception):
+    """
+    Raised for a request the service cannot answer, with the HTTP status to reply with
+    """
+
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+class CheckService:
+    """
+    Runs checks against the catalogs of a CatalogCache. Safe to call from several threads at once
+    """
+
+    def __init__(self, cache, log=None):
+        self.cache = cache
+        self.log = log or log_nothing
+
+    def _load(self, master_path, lto_paths, match_mode, result):
+        """
+        Returns the master catalog and the LTO catalogs of a check, recording their counts on result
+        """
+        if match_mode not in MATCH_MODES:
+            raise RequestError(400, "Unknown match mode: {}".format(match_mode))
+        master = self.cache.get("master", master_path, result)
+        ltos = [self.cache.get("lto", lto_path, result) for lto_path in lto_paths]
+        result.master_raw_count = master.raw_count
+        result.master_count = len(master.records)
+        result.lto_raw_count = sum(lto.raw_count for lto in ltos)
+        result.lto_count = sum(len(lto.records) for lto in ltos)
+        for lto in ltos:
+            result.sources.append(LTOSource(lto.path, lto.raw_count, len(lto.records)))
+        return master, ltos
+
+    def check(self, master_path, lto_paths, match_mode="contains", on_row=None):
+        """
+        Checks a master csv against one or more LTO csvs and returns the CheckResult, passing every RowResult to
+        on_row. Rows are in master order and then in the order the LTO csvs are given, as check_many orders them
+        """
+        result = CheckResult(keep_rows=False)
+        master, ltos = self._load(master_path, lto_paths, match_mode, result)
+        with result.metrics.phase("index") as phase:
+            indexes = [lto.index(match_mode) for lto in ltos]
+            phase.rows = result.lto_count
+        if len(ltos) == 1:
+            compare_index(result, master.records, indexes[0], result.sources[0], match_mode, on_row)
+            return result
+        lookups = [(index.matcher(match_mode), source) for index, source in zip(indexes, result.sources)]
+        with result.metrics.phase("compare", streams=True) as phase:
+            for row, source in _iter_many(master.records, lookups):
+                result.add(row, source)
+                if on_row is not None:
+                    on_row(row)
+            phase.rows = result.master_count
+        return result
+
+    def clip(self, master_path, lto_paths, name, match_mode="contains"):
+        """
+        Returns the RowResults of the master clips named name, which is empty when the master does not list it
+        """
+        result = CheckResult(keep_rows=False)
+        master, ltos = self._load(master_path, lto_paths, match_mode, result)
+        masters = master.index("exact").exact(name)
+        lookups = [(lto.index(match_mode).matcher(match_mode), None) for lto in ltos]
+        return [row for row, _ in _iter_many(masters, lookups)]
+
+    def _check_params(self, params):
+        master_path = _param(params, "master")
+        lto_paths = params.get("lto")
+        if not lto_paths:
+            raise RequestError(400, "Missing parameter: lto")
+        return master_path, lto_paths, _param(params, "match_mode", "contains")
+
+    def handle(self, route, params):
+        """
+        Answers a request to route with its query parameters ({name: [values]}), returning a JSON-able dict
+        """
+        if route == "/check" or route == "/summary":
+            master_path, lto_paths, match_mode = self._check_params(params)
+            show = _param(params, "rows", "all") if route == "/check" else "none"
+            if show not in ROW_CHOICES:
+                raise RequestError(400, "rows must be one of {}".format(", ".join(ROW_CHOICES)))
+            rows = []
+            on_row = None
+            if show == "all":
+                on_row = rows.append
+            elif show == "errors":
+                def on_row(row):
+                    if row.errors:
+                        rows.append(row)
+            result = self.check(master_path, lto_paths, match_mode, on_row)
+            reply = {"counts": counts(result), "summary": result.summary(),
+                     "sources": [{"path": source.path, "videos": source.count, "matches": source.matches,
+                                  "errors": source.errors} for source in result.sources],
+                     "metrics": result.metrics.as_dict()}
+            if route == "/check":
+                reply["rows"] = [row_dict(row) for row in rows]
+            return reply
+        if route == "/clip":
+            master_path, lto_paths, match_mode = self._check_params(params)
+            name = _param(params, "name")
+            return {"name": name, "rows": [row_dict(row) for row in self.clip(master_path, lto_paths, name,
+                                                                            match_mode)]}
+        if route == "/cache":
+            return self.cache.stats()
+        raise RequestError(404, "Unknown path: {}".format(route))
+
+
+def _iter_many(master_records, lookups):
+    """
+    Yields (RowResult, source) for each master record against several (lookup, source) pairs, in master order
+    and then lookup order; a master record no lookup finds yields a single not found result
+    """
+    for master in master_records:
+        found = False
+        for lookup, source in lookups:
+            for lto in lookup(master.name):
+                found = True
+                yield RowResult(master, lto, compare_records(master, lto)), source
+        if not found:
+            yield RowResult(master, None, NOT_FOUND), None
+
+
+def _param(params, name, default=None):
+    values = params.get(name)
+    if values:
+        return values[-1]
+    if default is None:
+        raise RequestError(400, "Missing parameter: {}".format(name))
+    return default
+
+
+def row_dict(row):
+    """
+    Returns the report columns of a RowResult as a dict keyed by the report header
+    """
+    return dict(zip(FIELDNAMES, report_line(row)))
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+"""
+Snapshot cache of parsed catalogs.
+The filtered, normalized and sorted records of a csv are saved as a binary snapshot keyed by the csv's path, size
+and mtime and the filter settings, so re-checking an unchanged master csv loads its records instead of parsing
+and sorting it again. Snapshots carry a format version, and the cache directory is kept under a size limit by
+removing the least recently used snapshots.
+"""
+
+# Import from Python Standard Library
+import gc
+import os
+import glob
+import pickle
+import hashlib
+import tempfile
+
+# Import from the package
+from ltocheck_defaults import DEFAULT_SNAPSHOT_DIR, DEFAULT_SNAPSHOT_MAX_MB
+from ltocheck_records import MasterRecord, LTORecord
+
+
+
+# bump when the snapshot layout or the records it holds change, so older snapshots are ignored
+SNAPSHOT_VERSION = 1
+
+SUFFIX = ".snapshot"
+_MAGIC = b"ltocheck snapshot\n"
+
+_RECORD_TYPES = {"MasterRecord": MasterRecord, "LTORecord": LTORecord}
+
+
+class SnapshotCache:
+    """
+    Directory of snapshots, one file per csv and filter settings. Loading a snapshot marks it as recently used,
+    and saving one evicts the least recently used snapshots until the directory holds at most max_bytes
+    """
+
+    def __init__(self, directory=DEFAULT_SNAPSHOT_DIR, max_bytes=DEFAULT_SNAPSHOT_MAX_MB * 1024 * 1024):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, scan, name):
+        """
+        Returns the key of a scan's snapshot: the csv's absolute path with the columns and filter the scan reads
+        with, which name the snapshot file, then the csv's size and mtime.
+        Raises FileNotFoundError when the csv does not exist
+        """
+        path = os.path.abspath(scan.input_file)
+        stat = os.stat(path)
+        identity = "\n".join(str(part) for part in (
+            SNAPSHOT_VERSION, name, path, ",".join(scan.fields),
+            "{}.{}".format(scan.is_video.__module__, scan.is_video.__qualname__)))
+        return identity, stat.st_size, stat.st_mtime_ns
+
+    def _path(self, key):
+        # one file per csv and filter settings, replaced when the csv changes
+        digest = hashlib.sha1(key[0].encode('utf-8', 'surrogatepass')).hexdigest()
+        return os.path.join(self.directory, digest + SUFFIX)
+
+    def load(self, key, scan):
+        """
+        Returns the sorted records saved for key, setting the scan's raw_count, or None when there is no usable
+        snapshot. Snapshots of another version or key, or that cannot be read, are removed
+        """
+        path = self._path(key)
+        # the collector would rescan the growing heap many times over while millions of records are created
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            with open(path, 'rb') as f:
+                if f.read(len(_MAGIC)) != _MAGIC:
+                    raise ValueError("not a snapshot")
+                header = pickle.load(f)
+                if header["version"] != SNAPSHOT_VERSION or header["key"] != key:
+                    raise ValueError("stale snapshot")
+                columns = pickle.load(f)
+            records = list(map(_RECORD_TYPES[header["record type"]], *columns)) if columns else []
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, EOFError, ValueError, KeyError, TypeError, pickle.UnpicklingError):
+            self.misses += 1
+            self._remove(path)
+            return None
+        finally:
+            if collecting:
+                gc.enable()
+        scan.raw_count = header["raw count"]
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return records
+
+    def save(self, key, scan, name, records):
+        """
+        Saves the sorted records read by a scan under key, unless the csv changed while it was read,
+        then evicts old snapshots. A snapshot that cannot be written, such as on a full disk, is skipped
+        """
+        if self.key(scan, name) != key:
+            return
+        record_type = type(records[0]).__name__ if records else "MasterRecord"
+        slots = MasterRecord.__slots__ + (LTORecord.__slots__ if record_type == "LTORecord" else ())
+        columns = [[getattr(record, slot) for record in records] for slot in slots] if records else []
+        header = {"version": SNAPSHOT_VERSION, "key": key, "record type": record_type, "raw count": scan.raw_count,
+                  "count": len(records)}
+        path = self._path(key)
+        # written to a temporary file and renamed, so a snapshot is either complete or absent
+        try:
+            f = tempfile.NamedTemporaryFile(dir=self.directory, suffix=".tmp", delete=False)
+        except OSError:
+            return
+        try:
+            with f:
+                f.write(_MAGIC)
+                pickle.dump(header, f, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(columns, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(f.name, path)
+        except OSError:
+            self._remove(f.name)
+            return
+        except BaseException:
+            self._remove(f.name)
+            raise
+        self.evict()
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def evict(self):
+        """
+        Removes the least recently used snapshots until the directory holds at most max_bytes
+        """
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, "*" + SUFFIX)):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            snapshots.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in snapshots)
+        for _, size, path in sorted(snapshots):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
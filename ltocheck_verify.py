@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+
+"""
+On-disk verification of files restored from tape.
+Every master clip is looked up in a restore directory and its bytes are hashed with large sequential reads
+on a thread pool (hashlib releases the GIL while hashing), optionally capped to a total throughput.
+The computed size and MD5 are compared to the master csv and reported in the usual report columns.
+"""
+
+# Import from Python Standard Library
+import os
+import time
+import hashlib
+import threading
+import concurrent.futures
+
+# Import from the package
+from ltocheck_engine import CheckResult, LTOSource, RowResult, NOT_FOUND, SIZE_MISMATCH, MD5_MISMATCH, \
+    READ_ERROR, load_master, log_nothing, progress_reporter
+from ltocheck_records import LTORecord
+
+
+READ_SIZE = 8 * 1024 * 1024
+
+
+class RateLimiter:
+    """
+    Token bucket shared by the hashing threads, capping the combined read rate to bytes_per_second
+    """
+
+    def __init__(self, bytes_per_second):
+        self.rate = float(bytes_per_second)
+        self.allowance = self.rate
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, count):
+        with self.lock:
+            now = time.monotonic()
+            self.allowance = min(self.rate, self.allowance + (now - self.last) * self.rate)
+            self.last = now
+            self.allowance -= count
+            wait = -self.allowance / self.rate if self.allowance < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+def hash_file(path, limiter=None):
+    """
+    Returns the size and MD5 digest of a file, read sequentially in READ_SIZE blocks into a reused buffer
+    """
+    md5 = hashlib.md5()
+    buffer = bytearray(READ_SIZE)
+    view = memoryview(buffer)
+    size = 0
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            count = f.readinto(buffer)
+            if not count:
+                break
+            if limiter is not None:
+                limiter.consume(count)
+            md5.update(view[:count])
+            size += count
+    return size, md5.digest()
+
+
+def find_restored(restore_path, names):
+    """
+    Walks the restore directory and returns the paths of the files whose clip name is in names, by clip name
+    """
+    found = {}
+    for directory, _, filenames in os.walk(restore_path):
+        for filename in filenames:
+            name = filename.split('.')[0]
+            if name in names:
+                found.setdefault(name, []).append(os.path.join(directory, filename))
+    return found
+
+
+def _pick(master, paths):
+    """
+    Chooses the restored file for a master clip when several files share its clip name (the clip and its
+    sidecars): the one with the master's size, otherwise the largest
+    """
+    if len(paths) == 1:
+        return paths[0]
+    sizes = [(os.path.getsize(path), path) for path in sorted(paths)]
+    for size, path in sizes:
+        if size == master.size:
+            return path
+    return max(sizes)[1]
+
+
+class VerifyResult(CheckResult):
+    """
+    CheckResult of a restore verification, adding the hashing throughput to the summary
+    """
+
+    def __init__(self, keep_rows=True):
+        CheckResult.__init__(self, keep_rows=keep_rows)
+        self.bytes_hashed = 0
+        self.read_errors = 0
+        self.cache_hits = None
+        self.cache_misses = None
+
+    def summary(self):
+        seconds = self.timings.get("hash", 0)
+        rate = self.bytes_hashed / seconds / 1e6 if seconds else 0
+        summary = ("Total Video Files on Master: {}"
+                   "\nRestored Files Found: {}"
+                   "\nMatches: {}"
+                   "\nNon-Matches: {}"
+                   "\nNot Found: {}"
+                   "\nRead Errors: {}"
+                   "\nBytes Hashed: {} in {:.1f}s ({:.1f} MB/s)"
+                   .format(self.master_count, self.lto_count, self.matches, self.non_matches, self.not_found,
+                           self.read_errors, self.bytes_hashed, seconds, rate))
+        if self.cache_hits is not None:
+            summary += "\nChecksum Cache: {} hits, {} misses".format(self.cache_hits, self.cache_misses)
+        return summary
+
+
+def _hash_cached(path, limiter, cache):
+    """
+    Returns the size and digest of a file from the checksum cache when it is unchanged, hashing it otherwise,
+    and whether the cache answered
+    """
+    key = os.path.abspath(path)
+    stat = os.stat(path)
+    md5 = cache.get(key, stat)
+    if md5 is not None:
+        return (stat.st_size, md5), True
+    hashed = hash_file(path, limiter)
+    after = os.stat(path)
+    if (after.st_size, after.st_mtime_ns, after.st_ino) == (stat.st_size, stat.st_mtime_ns, stat.st_ino):
+        cache.put(key, stat, hashed[1])
+    return hashed, False
+
+
+def verify(master_path, restore_path, jobs=None, max_rate=None, cache=None, on_row=None, keep_rows=True, log=None,
+           progress=None):
+    """
+    Hashes the restored file of every master clip found under restore_path and returns the VerifyResult.
+    max_rate caps the combined read throughput in bytes per second; cache is an optional HashCache
+    consulted before any file is read. progress is called with ("hash", clips done, master clip count)
+    """
+    log = log or log_nothing
+    if not os.path.isdir(restore_path):
+        raise FileNotFoundError(2, "No such file or directory", restore_path)
+    result = VerifyResult(keep_rows=keep_rows)
+    master_records = load_master(result, master_path, log, progress_reporter("read master", None, progress))
+
+    log("Attempting to find restored files under {}".format(restore_path))
+    with result.metrics.phase("find") as phase:
+        restored = find_restored(restore_path, {master.name for master in master_records})
+        phase.rows = len(restored)
+    source = LTOSource(restore_path)
+    result.sources.append(source)
+    result.lto_count = source.count = len(restored)
+    log("{} restored files found for {} master clips".format(len(restored), result.master_count))
+
+    limiter = RateLimiter(max_rate) if max_rate else None
+
+    def _hash(master):
+        paths = restored.get(master.name)
+        if not paths:
+            return None, None, False
+        path = paths[0]
+        try:
+            path = _pick(master, paths)
+            if cache is not None:
+                return (path,) + _hash_cached(path, limiter, cache)
+            return path, hash_file(path, limiter), False
+        except OSError as e:
+            log("Failed to read {}: {}".format(path, e))
+            return path, None, False
+
+    log("Attempting to hash restored files")
+    report = progress_reporter("hash", result.master_count, progress)
+    if report is not None:
+        report(0)
+    with result.metrics.phase("hash", streams=True) as phase, \
+            concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        hashes = zip(master_records, executor.map(_hash, master_records))
+        for done, (master, (path, hashed, cached)) in enumerate(hashes, 1):
+            if path is None:
+                row = RowResult(master, None, NOT_FOUND)
+            else:
+                media = os.path.relpath(path, restore_path)
+                if hashed is None:
+                    result.read_errors += 1
+                    row = RowResult(master, LTORecord(master.name, "", "", "", media), READ_ERROR)
+                else:
+                    size, md5 = hashed
+                    if not cached:
+                        result.bytes_hashed += size
+                    errors = 0
+                    if size != master.size:
+                        errors |= SIZE_MISMATCH
+                    if md5 != master.md5:
+                        errors |= MD5_MISMATCH
+                    row = RowResult(master, LTORecord(master.name, "", size, md5, media), errors)
+            result.add(row, source if path is not None else None)
+            if on_row is not None:
+                on_row(row)
+            if report is not None:
+                report(done)
+        phase.rows = result.master_count
+    if cache is not None:
+        result.cache_hits = cache.hits
+        result.cache_misses = cache.misses
+    return result
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+
+"""
+Watch mode: re-checks a master csv as LTO exports land in a drop folder.
+The folder is polled and files are compared by size and mtime, so no OS specific file events are needed. The
+parsed master and the name index and hits of every LTO csv are kept in memory: only a new or changed csv is read and
+compared to the master, the hits of the other csvs are reused, and the report and summary are rewritten after each
+change.
+"""
+
+# Import from Python Standard Library
+import os
+import csv
+import glob
+import time
+
+# Import from the package
+from ltocheck_csvfile import UnsupportedCompression
+from ltocheck_defaults import DEFAULT_WATCH_INTERVAL, DEFAULT_WATCH_PATTERNS
+from ltocheck_engine import CheckResult, LTOSource, RowResult, NOT_FOUND, compare_records, load_master, log_nothing
+from ltocheck_index import NameIndex
+from ltocheck_ingest import read_lto
+from ltocheck_report import ReportWriter
+
+
+# errors of an LTO csv that cannot be read yet or at all; it is retried once it changes again
+_READ_ERRORS = (OSError, KeyError, ValueError, csv.Error, UnsupportedCompression)
+
+
+def _stamp(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class WatchedFile:
+    """
+    One LTO csv of the drop folder: its records, name index and the hits of the master clips it carries,
+    as {master position: [RowResult, ...]}
+    """
+    __slots__ = ('path', 'stamp', 'raw_count', 'records', 'index', 'hits')
+
+    def __init__(self, path, stamp, raw_count, records):
+        self.path = path
+        self.stamp = stamp
+        self.raw_count = raw_count
+        self.records = records
+        self.index = NameIndex(records)
+        self.hits = {}
+
+    def match(self, master_records, match_mode):
+        """
+        Compares the master clips to this csv, keeping the hits of those it carries
+        """
+        self.index.prepare(match_mode)
+        lookup = self.index.matcher(match_mode)
+        hits = {}
+        for position, master in enumerate(master_records):
+            found = lookup(master.name)
+            if found:
+                hits[position] = [RowResult(master, lto, compare_records(master, lto)) for lto in found]
+        self.hits = hits
+
+
+class Watcher:
+    """
+    Keeps the state of a watched check. poll() picks up new, changed and removed LTO csvs in the folder and a
+    changed master csv, and returns the CheckResult of the updated check, or None when nothing changed.
+    With settle=True a new or changed csv is only read once its size and mtime are the same on two polls in a row,
+    so files still being copied are left for a later poll
+    """
+
+    def __init__(self, master_path, directory, patterns=DEFAULT_WATCH_PATTERNS, match_mode="contains", output=None,
+                 snapshots=None, log=None):
+        self.master_path = master_path
+        self.directory = directory
+        self.patterns = patterns
+        self.match_mode = match_mode
+        self.output = output
+        self.snapshots = snapshots
+        self.log = log or log_nothing
+        self.master_stamp = None
+        self.master_records = []
+        self.master_raw_count = 0
+        self.files = {}
+        self.result = None
+        self._seen = {}
+        self._failed = {}
+
+    def _paths(self):
+        paths = set()
+        for pattern in self.patterns:
+            paths.update(glob.glob(os.path.join(self.directory, pattern)))
+        if self.output is not None:
+            # the report may be written into the watched folder
+            output = os.path.abspath(self.output)
+            paths = {path for path in paths if os.path.abspath(path) != output}
+        return sorted(paths)
+
+    def _changed_files(self, settle):
+        """
+        Returns the paths and stamps of new or changed csvs ready to be read, and the paths of removed csvs
+        """
+        stamps = {}
+        for path in self._paths():
+            try:
+                stamps[path] = _stamp(path)
+            except OSError:     # removed since it was listed
+                continue
+        ready = []
+        for path, stamp in stamps.items():
+            known = self.files.get(path)
+            if known is not None and known.stamp == stamp or self._failed.get(path) == stamp:
+                continue
+            if not settle or self._seen.get(path) == stamp:
+                ready.append((path, stamp))
+        removed = [path for path in self.files if path not in stamps]
+        self._seen = stamps
+        return ready, removed
+
+    def _read(self, result, path, stamp):
+        """
+        Reads one LTO csv, returning its WatchedFile or None when it cannot be read
+        """
+        try:
+            with result.metrics.phase("read lto") as phase:
+                records, raw_count = read_lto(path)
+                phase.rows = raw_count
+        except _READ_ERRORS as e:
+            self.log("Skipping LTO csv {}: {}".format(path, e))
+            self._failed[path] = stamp
+            return None
+        self._failed.pop(path, None)
+        self.log("LTO csv read from path {}\n{} files found, {} video files filtered"
+                 .format(path, raw_count, len(records)))
+        return WatchedFile(path, stamp, raw_count, records)
+
+    def poll(self, settle=True):
+        result = CheckResult(keep_rows=False)
+        master_changed = False
+        master_stamp = _stamp(self.master_path)
+        if master_stamp != self.master_stamp:
+            self.master_records = load_master(result, self.master_path, self.log, snapshots=self.snapshots)
+            self.master_raw_count = result.master_raw_count
+            self.master_stamp = master_stamp
+            master_changed = True
+
+        with result.metrics.phase("scan folder") as phase:
+            ready, removed = self._changed_files(settle)
+            phase.rows = len(self._seen)
+        if not (master_changed or ready or removed):
+            return None
+
+        for path in removed:
+            self.log("LTO csv removed: {}".format(path))
+            del self.files[path]
+        dropped = len(removed)
+        added = []
+        for path, stamp in ready:
+            watched = self._read(result, path, stamp)
+            if self.files.pop(path, None) is not None:
+                dropped += 1
+            if watched is not None:
+                self.files[path] = watched
+                added.append(watched)
+        if master_changed:
+            added = list(self.files.values())
+        elif not (added or dropped):
+            return None     # only csvs that cannot be read changed
+        with result.metrics.phase("compare") as phase:
+            for watched in added:
+                watched.match(self.master_records, self.match_mode)
+            phase.rows = len(added) * len(self.master_records)
+        self.log("{} LTO csvs compared to {} master clips, the hits of {} other csvs reused"
+                 .format(len(added), len(self.master_records), len(self.files) - len(added)))
+
+        self._collect(result)
+        if self.output is not None:
+            self._write_report(result)
+        self.result = result
+        return result
+
+    def _rows(self):
+        """
+        Yields (RowResult, WatchedFile or None) for the current results, in master order and then csv path order,
+        as check_many orders them
+        """
+        files = [self.files[path] for path in sorted(self.files)]
+        for position, master in enumerate(self.master_records):
+            found = False
+            for watched in files:
+                rows = watched.hits.get(position)
+                if rows is not None:
+                    found = True
+                    for row in rows:
+                        yield row, watched
+            if not found:
+                yield RowResult(master, None, NOT_FOUND), None
+
+    def rows(self):
+        """
+        Yields the current result rows in report order
+        """
+        for row, _ in self._rows():
+            yield row
+
+    def _collect(self, result):
+        """
+        Fills the counts of the result from the hits of every csv
+        """
+        result.master_raw_count = self.master_raw_count
+        result.master_count = len(self.master_records)
+        sources = {}
+        for path in sorted(self.files):
+            watched = self.files[path]
+            sources[path] = LTOSource(path, watched.raw_count, len(watched.records))
+            result.lto_raw_count += watched.raw_count
+            result.lto_count += len(watched.records)
+        result.sources = list(sources.values())
+        with result.metrics.phase("collect") as phase:
+            for row, watched in self._rows():
+                result.add(row, sources[watched.path] if watched is not None else None)
+            phase.rows = result.master_count
+
+    def _write_report(self, result):
+        """
+        Rewrites the rolling report through a temporary file, so readers never see a partial report
+        """
+        directory, name = os.path.split(self.output)
+        temporary = os.path.join(directory, ".{}.tmp{}".format(name, os.path.splitext(name)[1]))
+        with ReportWriter(temporary) as report:
+            report.write_rows(self.rows())
+        os.replace(temporary, self.output)
+        result.metrics.split("write report", report.seconds, report.rows_written)
+
+    def run(self, interval=DEFAULT_WATCH_INTERVAL, on_update=None, stop=None):
+        """
+        Polls every interval seconds until stop (a threading.Event) is set, calling on_update with each updated
+        CheckResult. The csvs already in the folder are read on the first poll without waiting for them to settle
+        """
+        settle = False
+        while stop is None or not stop.is_set():
+            result = self.poll(settle)
+            settle = True
+            if result is not None and on_update is not None:
+                on_update(result)
+            if stop is not None:
+                stop.wait(interval)
+            else:
+                time.sleep(interval)
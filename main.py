@@ -6,12 +6,20 @@ Compares file size, frame quantity and MD5 Hash.
 """
 
 # Import from Python Standard Library
-import gui
 import argparse
 import datetime
+import contextlib
 
 # Import from this package
 import ltocheck_cli
+import ltocheck_metrics
+from ltocheck_console import SHOW_CHOICES
+from ltocheck_csvfile import ZSTD_AVAILABLE, compression_of_name
+from ltocheck_defaults import DEFAULT_CATALOG, DEFAULT_HASH_CACHE, DEFAULT_HASH_CACHE_MAX_ENTRIES, \
+    DEFAULT_HASH_CACHE_MAX_AGE_DAYS, DEFAULT_SNAPSHOT_DIR, DEFAULT_SNAPSHOT_MAX_MB, DEFAULT_WATCH_INTERVAL, \
+    DEFAULT_WATCH_PATTERNS, DEFAULT_SERVE_HOST, DEFAULT_SERVE_PORT, DEFAULT_SERVE_CACHE_MB, shown_path
+from ltocheck_engine import ENGINES
+from ltocheck_index import MATCH_MODES
 
 __author__ = "Nick Everett"
 __version__ = "1.0"
@@ -33,33 +41,203 @@ def parse_args():
 
     parser.add_argument("-m", "--master_csv_path", type=str,
                         help="master csv input file path (required)")
-    parser.add_argument("-l", "--lto_csv_path", type=str,
-                        help="LTO csv input file path (required)")
+    parser.add_argument("-l", "--lto_csv_path", type=str, nargs="+",
+                        help="LTO csv input file paths or glob patterns, checked in parallel when several are given "
+                             "(required)")
+    parser.add_argument("--catalog", type=str, default=None,
+                        help="check against every LTO csv loaded into this catalog by 'ltocheck index' "
+                             "instead of -l")
     parser.add_argument("-d", "--out_path", action="store", default='.',
                         help="output destination path")
     parser.add_argument("-o", "--out_name", action="store", default=out_filename,
                         help="output filename")
+    parser.add_argument("--match-mode", choices=MATCH_MODES, default="contains",
+                        help="how master names are matched to LTO names: exact name, "
+                             "LTO name starts with master name, or LTO name contains master name (default)")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="worker processes: splits a single LTO csv check into this many shards, "
+                             "or caps the workers used for several LTO csvs (default: one per CPU for several csvs)")
+    parser.add_argument("--max-memory", type=int, default=None, metavar="MB",
+                        help="sort both csvs on disk within this memory budget and merge-join them in one pass, "
+                             "for catalogs larger than RAM (requires --match-mode exact and a single LTO csv)")
+    parser.add_argument("--engine", choices=ENGINES, default="python",
+                        help="comparison engine for a single LTO csv: the pure Python engine (default), or the "
+                             "numpy based columnar engine, faster on large catalogs (falls back to python "
+                             "without numpy)")
+    parser.add_argument("--since", type=str, default=None, metavar="PREVIOUS_REPORT",
+                        help="only compare the clips whose master or LTO rows changed since this earlier report, "
+                             "reusing its other rows; also writes the re-evaluated rows to a _delta report "
+                             "(single LTO csv)")
+    parser.add_argument("--snapshot-dir", type=str, default=DEFAULT_SNAPSHOT_DIR, metavar="PATH",
+                        help="directory of snapshots of parsed master csvs, reused while the csv is unchanged "
+                             "(default: {})".format(shown_path(DEFAULT_SNAPSHOT_DIR)))
+    parser.add_argument("--no-snapshots", action="store_const", const=None, dest="snapshot_dir",
+                        help="always parse the master csv, without reading or saving snapshots")
+    parser.add_argument("--snapshot-max-size", type=int, default=DEFAULT_SNAPSHOT_MAX_MB, metavar="MB",
+                        help="remove the least recently used snapshots beyond this total size (default: {})"
+                        .format(DEFAULT_SNAPSHOT_MAX_MB))
     parser.add_argument(
         "-v",
         "--verbose",
         action="count",
         default=0,
         help="verbosity (-v) or debug mode (-vv)")
+    parser.add_argument("--show", choices=SHOW_CHOICES, default=None,
+                        help="result rows printed with -v (default: errors on a terminal, where a live progress "
+                             "line is shown, otherwise all)")
+    parser.add_argument("--metrics-json", type=str, default=None, metavar="PATH",
+                        help="write the per-phase timings, rows/s, peak memory and counts of the run to a JSON file")
+    parser.add_argument("--profile", type=str, default=None, metavar="PATH",
+                        help="profile the run with cProfile, saving the stats to PATH and printing the costliest "
+                             "calls")
     parser.add_argument(
         "--version",
         action="version",
         version="{} (version {})".format("%(prog)s", __version__))
+
+    subparsers = parser.add_subparsers(dest="command", metavar="{index,verify,watch,serve}")
+    index_parser = subparsers.add_parser(
+        "index", help="load LTO csvs into a local catalog, skipping csvs unchanged since they were last loaded")
+    index_parser.add_argument("lto_csv_paths", nargs="+",
+                              help="LTO csv input file paths or glob patterns")
+    index_parser.add_argument("--catalog", type=str, default=DEFAULT_CATALOG,
+                              help="catalog database path (default: {})".format(shown_path(DEFAULT_CATALOG)))
+    index_parser.add_argument("-v", "--verbose", action="count", default=0,
+                              help="list each csv as it is loaded")
+
+    verify_parser = subparsers.add_parser(
+        "verify", help="hash the files restored from tape and compare them to the master csv")
+    verify_parser.add_argument("-m", "--master_csv_path", type=str, required=True,
+                               help="master csv input file path (required)")
+    verify_parser.add_argument("-r", "--restore_path", type=str, required=True,
+                               help="directory holding the restored files (required)")
+    verify_parser.add_argument("-d", "--out_path", action="store", default='.',
+                               help="output destination path")
+    verify_parser.add_argument("-o", "--out_name", action="store", default=out_filename,
+                               help="output filename")
+    verify_parser.add_argument("-j", "--jobs", type=int, default=None,
+                               help="files hashed at once (default: CPU count + 4, at most 32)")
+    verify_parser.add_argument("--max-rate", type=float, default=None, metavar="MB/S",
+                               help="cap the combined read throughput, in megabytes per second")
+    verify_parser.add_argument("--hash-cache", type=str, default=DEFAULT_HASH_CACHE, metavar="PATH",
+                               help="checksum cache reused for files unchanged since they were last hashed "
+                                    "(default: {})".format(shown_path(DEFAULT_HASH_CACHE)))
+    verify_parser.add_argument("--no-hash-cache", action="store_const", const=None, dest="hash_cache",
+                               help="hash every file without reading or updating the checksum cache")
+    verify_parser.add_argument("--cache-max-age", type=float, default=DEFAULT_HASH_CACHE_MAX_AGE_DAYS,
+                               metavar="DAYS",
+                               help="evict cached checksums unused for this many days (default: {})"
+                               .format(DEFAULT_HASH_CACHE_MAX_AGE_DAYS))
+    verify_parser.add_argument("--cache-max-entries", type=int, default=DEFAULT_HASH_CACHE_MAX_ENTRIES,
+                               metavar="N",
+                               help="keep at most this many cached checksums (default: {})"
+                               .format(DEFAULT_HASH_CACHE_MAX_ENTRIES))
+    verify_parser.add_argument("-v", "--verbose", action="count", default=0,
+                               help="verbosity (-v) or debug mode (-vv)")
+    verify_parser.add_argument("--show", choices=SHOW_CHOICES, default=None,
+                               help="result rows printed with -v (default: errors on a terminal, otherwise all)")
+    verify_parser.add_argument("--metrics-json", type=str, default=argparse.SUPPRESS, metavar="PATH",
+                               help="write the per-phase timings, rows/s, peak memory and counts to a JSON file")
+    verify_parser.add_argument("--profile", type=str, default=argparse.SUPPRESS, metavar="PATH",
+                               help="profile the run with cProfile, saving the stats to PATH")
+
+    watch_parser = subparsers.add_parser(
+        "watch", help="re-check the master csv whenever LTO csvs are added to, changed in or removed from a folder")
+    watch_parser.add_argument("-m", "--master_csv_path", type=str, required=True,
+                              help="master csv input file path (required)")
+    watch_parser.add_argument("-w", "--watch_path", type=str, required=True,
+                              help="folder the LTO csvs are exported to (required)")
+    watch_parser.add_argument("--pattern", type=str, nargs="+", default=list(DEFAULT_WATCH_PATTERNS),
+                              help="file name patterns of the LTO csvs in the folder (default: {})"
+                              .format(" ".join(DEFAULT_WATCH_PATTERNS)))
+    watch_parser.add_argument("--interval", type=float, default=DEFAULT_WATCH_INTERVAL, metavar="SECONDS",
+                              help="seconds between two scans of the folder (default: {})"
+                              .format(DEFAULT_WATCH_INTERVAL))
+    watch_parser.add_argument("--once", action="store_true",
+                              help="check the csvs in the folder once and exit")
+    watch_parser.add_argument("--match-mode", choices=MATCH_MODES, default="contains",
+                              help="how master names are matched to LTO names (default: contains)")
+    watch_parser.add_argument("-d", "--out_path", action="store", default='.',
+                              help="output destination path")
+    watch_parser.add_argument("-o", "--out_name", action="store", default="lto_check_watch_report.csv",
+                              help="output filename, rewritten after every change (default: "
+                                   "lto_check_watch_report.csv)")
+    watch_parser.add_argument("--snapshot-dir", type=str, default=DEFAULT_SNAPSHOT_DIR, metavar="PATH",
+                              help="directory of snapshots of parsed master csvs (default: {})"
+                              .format(shown_path(DEFAULT_SNAPSHOT_DIR)))
+    watch_parser.add_argument("--no-snapshots", action="store_const", const=None, dest="snapshot_dir",
+                              help="always parse the master csv, without reading or saving snapshots")
+    watch_parser.add_argument("--snapshot-max-size", type=int, default=DEFAULT_SNAPSHOT_MAX_MB, metavar="MB",
+                              help="remove the least recently used snapshots beyond this total size (default: {})"
+                              .format(DEFAULT_SNAPSHOT_MAX_MB))
+    watch_parser.add_argument("-v", "--verbose", action="count", default=0,
+                              help="print the phase timings of each update (-v) or debug mode (-vv)")
+
+    serve_parser = subparsers.add_parser(
+        "serve", help="answer checks over local HTTP/JSON, keeping the parsed csvs in memory between requests")
+    serve_parser.add_argument("--host", type=str, default=DEFAULT_SERVE_HOST,
+                              help="address to listen on (default: {})".format(DEFAULT_SERVE_HOST))
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_SERVE_PORT,
+                              help="port to listen on (default: {})".format(DEFAULT_SERVE_PORT))
+    serve_parser.add_argument("--cache-size", type=int, default=DEFAULT_SERVE_CACHE_MB, metavar="MB",
+                              help="memory for parsed csvs, the least recently used are dropped beyond it "
+                                   "(default: {})".format(DEFAULT_SERVE_CACHE_MB))
+    serve_parser.add_argument("--snapshot-dir", type=str, default=DEFAULT_SNAPSHOT_DIR, metavar="PATH",
+                              help="directory of snapshots of parsed master csvs (default: {})"
+                              .format(shown_path(DEFAULT_SNAPSHOT_DIR)))
+    serve_parser.add_argument("--no-snapshots", action="store_const", const=None, dest="snapshot_dir",
+                              help="always parse the master csvs, without reading or saving snapshots")
+    serve_parser.add_argument("--snapshot-max-size", type=int, default=DEFAULT_SNAPSHOT_MAX_MB, metavar="MB",
+                              help="remove the least recently used snapshots beyond this total size (default: {})"
+                              .format(DEFAULT_SNAPSHOT_MAX_MB))
+    serve_parser.add_argument("-v", "--verbose", action="count", default=0,
+                              help="log requests and csv loads (-v) or debug mode (-vv)")
+
     args = parser.parse_args()
+    if args.catalog is not None and args.lto_csv_path:
+        parser.error("use either -l or --catalog")
+    if args.command != "index" and compression_of_name(args.out_name) == "zstd" and not ZSTD_AVAILABLE:
+        parser.error("writing a .zst report requires the zstandard package")
+    if args.max_memory is not None:
+        if args.max_memory < 1:
+            parser.error("--max-memory must be at least 1 MB")
+        if args.catalog is not None:
+            parser.error("--max-memory cannot be combined with --catalog")
+        if args.match_mode != "exact":
+            parser.error("--max-memory requires --match-mode exact")
+        if args.lto_csv_path and len(args.lto_csv_path) > 1:
+            parser.error("--max-memory takes a single LTO csv")
+    if args.engine == "columnar":
+        if args.catalog is not None or args.max_memory is not None or (args.jobs and args.jobs > 1):
+            parser.error("--engine columnar cannot be combined with --catalog, --max-memory or --jobs")
+        if args.lto_csv_path and len(args.lto_csv_path) > 1:
+            parser.error("--engine columnar takes a single LTO csv")
+    if args.since is not None:
+        if args.catalog is not None or args.max_memory is not None or (args.jobs and args.jobs > 1) \
+                or args.engine != "python":
+            parser.error("--since cannot be combined with --catalog, --max-memory, --jobs or --engine columnar")
+        if args.lto_csv_path and len(args.lto_csv_path) > 1:
+            parser.error("--since takes a single LTO csv")
     return args
 
 
 def main():
     args = parse_args()  # Read the command-line arguments
 
-    if args.master_csv_path and args.lto_csv_path:              # If there is an argument,
-        ltocheck_cli.check(args)      # run the command-line version
-    else:
-        gui.vp_start_gui()      # otherwise run the GUI version
+    with ltocheck_metrics.profile(args.profile) if args.profile else contextlib.nullcontext():
+        if args.command == "index":
+            ltocheck_cli.index(args)
+        elif args.command == "verify":
+            ltocheck_cli.verify(args)
+        elif args.command == "watch":
+            ltocheck_cli.watch(args)
+        elif args.command == "serve":
+            ltocheck_cli.serve(args)
+        elif args.master_csv_path and (args.lto_csv_path or args.catalog):              # If there is an argument,
+            ltocheck_cli.check(args)      # run the command-line version
+        else:
+            import gui      # tkinter is only loaded for the GUI
+            gui.vp_start_gui()      # otherwise run the GUI version
 
 
 if __name__ == "__main__":
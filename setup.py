@@ -17,7 +17,8 @@ under the License.
 
 import io
 import os
-import main
+import re
+import glob
 from setuptools import setup, find_packages
 
 
@@ -34,11 +35,22 @@ def read(*filenames, **kwargs):
     return sep.join(buf)
 
 
+def read_version():
+    """
+    Reads __version__ from main.py without importing it, which would load the whole package
+    """
+    match = re.search(r'^__version__ = "([^"]+)"', read('main.py'), re.MULTILINE)
+    return match.group(1)
+
+
 long_description = read('README.md')
+modules = sorted(os.path.splitext(os.path.basename(path))[0]
+                 for pattern in ('main.py', 'gui*.py', 'ltocheck_*.py')
+                 for path in glob.glob(os.path.join(here, pattern)))
 
 setup(
     name='ltocheck',
-    version=main.__version__,
+    version=read_version(),
     url='https://github.com/nickever/ltocheck_gui',
     license='GNU General Public License v3.0',
     author='Nick Everett',
@@ -46,7 +58,7 @@ setup(
     description='Command line interface tool to compare a master csv with an LTO csv',
     long_description=long_description,
     keywords='ltocheck csv lto tape compare',
-    py_modules=['ltocheck'],
+    py_modules=modules,
     entry_points={
         'console_scripts': [
             'ltocheck=main:main',
@@ -54,6 +66,10 @@ setup(
     },
     platforms='macOS',
     install_requires=[],
+    extras_require={
+        'columnar': ['numpy'],
+        'zstd': ['zstandard'],
+    },
     classifiers=[
         'Programming Language :: Python',
         'Development Status :: 3 - Alpha',